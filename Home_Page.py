@@ -3,8 +3,7 @@ Home_Page.py - Relaylist
 Transform your conversations into personalized music experiences
 """
 import streamlit as st
-from utils.database import init_database, get_all_sessions
-import os
+from utils.database import init_database, get_recent_sessions
 
 # Page configuration
 st.set_page_config(
@@ -14,12 +13,8 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Load custom CSS
-def load_css():
-    css_file = "styles/custom.css"
-    if os.path.exists(css_file):
-        with open(css_file) as f:
-            st.markdown(f'<style>{f.read()}</style>', unsafe_allow_html=True)
+# Load custom CSS (cached for the process lifetime)
+from utils.styles import load_css
 
 load_css()
 
@@ -70,104 +65,122 @@ load_css()
 # </style>
 # """, unsafe_allow_html=True)
 
-# Initialize database
-init_database()
-
-# Initialize session state variables
-if 'analysis_complete' not in st.session_state:
-    st.session_state.analysis_complete = False
-if 'recommendations_ready' not in st.session_state:
-    st.session_state.recommendations_ready = False
-if 'current_session_id' not in st.session_state:
-    st.session_state.current_session_id = None
-if 'spotify_authenticated' not in st.session_state:
-    st.session_state.spotify_authenticated = False
-
-# Main header - Spotify gradient style
-st.markdown("""
+# Static HTML blocks
+HEADER_HTML = """
 <div style='text-align: center; padding: 3rem 0 2rem 0;'>
     <h1 style='font-size: 4rem; margin-bottom: 0.5rem; background: linear-gradient(90deg, #1DB954 0%, #1ed760 100%); -webkit-background-clip: text; -webkit-text-fill-color: transparent; background-clip: text; font-weight: 700;'>Relaylist</h1>
     <p style='font-size: 1.25rem; color: #B3B3B3; font-weight: 500;'>Transform conversations into music</p>
 </div>
-""", unsafe_allow_html=True)
-
-st.markdown("<br>", unsafe_allow_html=True)
+<br>
+"""
 
-# Introduction section
-st.markdown("""
-<div style='background-color: #181818; padding: 32px; border-radius: 8px; border: 1px solid #282828; margin-bottom: 32px;'>
-    <p style='color: #FFFFFF; font-size: 1.1rem; line-height: 1.6; margin: 0;'>
+INTRO_HTML = """
+<div class='card card-hero'>
+    <p>
         Relaylist analyzes the emotional landscape of your SMS conversations and creates Spotify playlists that match the mood and energy of your chats. Using advanced natural language processing, we understand the feelings behind your words and translate them into music you'll love.
     </p>
 </div>
-""", unsafe_allow_html=True)
+"""
 
-# How it works section
-st.markdown("<h3 style='color: #FFFFFF; margin-top: 2rem; margin-bottom: 1.5rem;'>How It Works</h3>", unsafe_allow_html=True)
+SECTION_HEADING_HTML = "<h3 style='color: #FFFFFF; margin-top: 2rem; margin-bottom: 1.5rem;'>{title}</h3>"
 
-col1, col2, col3 = st.columns(3)
+# (icon, title, description) for each "How It Works" card
+HOW_IT_WORKS_CARDS = [
+    ("↑", "Upload", "Export your SMS conversations as a CSV file and upload it to Relaylist. We support standard SMS export formats."),
+    ("○", "Analyze", "Our NLP engine analyzes emotions, sentiment patterns, key topics, and conversation dynamics."),
+    ("♪", "Discover", "Get personalized Spotify recommendations that match your conversation's emotional tone and your music preferences."),
+]
 
-with col1:
-    st.markdown("""
-    <div style='background-color: #181818; border: 1px solid #282828; border-radius: 8px; padding: 32px 24px; text-align: center; min-height: 320px; display: flex; flex-direction: column; justify-content: center;'>
-        <div style='font-size: 3.5rem; color: #1DB954; margin-bottom: 20px; font-weight: 200;'>↑</div>
-        <h4 style='color: #FFFFFF; margin-bottom: 16px; font-weight: 700; font-size: 1.25rem;'>Upload</h4>
-        <p style='color: #B3B3B3; font-size: 0.938rem; line-height: 1.6;'>Export your SMS conversations as a CSV file and upload it to Relaylist. We support standard SMS export formats.</p>
-    </div>
-    """, unsafe_allow_html=True)
-
-with col2:
-    st.markdown("""
-    <div style='background-color: #181818; border: 1px solid #282828; border-radius: 8px; padding: 32px 24px; text-align: center; min-height: 320px; display: flex; flex-direction: column; justify-content: center;'>
-        <div style='font-size: 3.5rem; color: #1DB954; margin-bottom: 20px; font-weight: 200;'>○</div>
-        <h4 style='color: #FFFFFF; margin-bottom: 16px; font-weight: 700; font-size: 1.25rem;'>Analyze</h4>
-        <p style='color: #B3B3B3; font-size: 0.938rem; line-height: 1.6;'>Our NLP engine analyzes emotions, sentiment patterns, key topics, and conversation dynamics.</p>
-    </div>
-    """, unsafe_allow_html=True)
-
-with col3:
-    st.markdown("""
-    <div style='background-color: #181818; border: 1px solid #282828; border-radius: 8px; padding: 32px 24px; text-align: center; min-height: 320px; display: flex; flex-direction: column; justify-content: center;'>
-        <div style='font-size: 3.5rem; color: #1DB954; margin-bottom: 20px; font-weight: 200;'>♪</div>
-        <h4 style='color: #FFFFFF; margin-bottom: 16px; font-weight: 700; font-size: 1.25rem;'>Discover</h4>
-        <p style='color: #B3B3B3; font-size: 0.938rem; line-height: 1.6;'>Get personalized Spotify recommendations that match your conversation's emotional tone and your music preferences.</p>
-    </div>
-    """, unsafe_allow_html=True)
+STEP_CARD_HTML = """<div class='card card-step'>
+    <div class='card-icon'>{icon}</div>
+    <h4 class='card-title'>{title}</h4>
+    <p class='card-text'>{description}</p>
+</div>"""
 
-st.markdown("<br><br>", unsafe_allow_html=True)
+# (title, bullet points) for each "What We Analyze" card
+WHAT_WE_ANALYZE_CARDS = [
+    ("Emotional Analysis", [
+        "Primary emotions: joy, sadness, anger, surprise, fear",
+        "Emotional distribution throughout conversation",
+        "Sentiment polarity and subjectivity",
+        "Mood trends over time",
+    ]),
+    ("Conversation Insights", [
+        "Key topics and themes discussed",
+        "Temporal messaging patterns",
+        "Vocabulary richness and communication style",
+        "Response dynamics and engagement levels",
+    ]),
+]
 
-# What we analyze section
-st.markdown("<h3 style='color: #FFFFFF; margin-top: 2rem; margin-bottom: 1.5rem;'>What We Analyze</h3>", unsafe_allow_html=True)
+FEATURE_CARD_HTML = """<div class='card'>
+    <h4 class='card-title'>{title}</h4>
+    <ul class='card-list'>
+{items}
+    </ul>
+</div>"""
 
-col1, col2 = st.columns(2)
+FEATURE_ITEM_HTML = "        <li>{item}</li>"
 
-with col1:
-    st.markdown("""
-    <div style='background-color: #181818; border: 1px solid #282828; border-radius: 8px; padding: 24px;'>
-        <h4 style='color: #FFFFFF; margin-bottom: 20px; font-weight: 700; font-size: 1.125rem;'>Emotional Analysis</h4>
-        <ul style='color: #B3B3B3; line-height: 2; margin: 0; padding-left: 20px;'>
-            <li style='padding: 6px 0;'>Primary emotions: joy, sadness, anger, surprise, fear</li>
-            <li style='padding: 6px 0;'>Emotional distribution throughout conversation</li>
-            <li style='padding: 6px 0;'>Sentiment polarity and subjectivity</li>
-            <li style='padding: 6px 0;'>Mood trends over time</li>
-        </ul>
-    </div>
-    """, unsafe_allow_html=True)
-
-with col2:
-    st.markdown("""
-    <div style='background-color: #181818; border: 1px solid #282828; border-radius: 8px; padding: 24px;'>
-        <h4 style='color: #FFFFFF; margin-bottom: 20px; font-weight: 700; font-size: 1.125rem;'>Conversation Insights</h4>
-        <ul style='color: #B3B3B3; line-height: 2; margin: 0; padding-left: 20px;'>
-            <li style='padding: 6px 0;'>Key topics and themes discussed</li>
-            <li style='padding: 6px 0;'>Temporal messaging patterns</li>
-            <li style='padding: 6px 0;'>Vocabulary richness and communication style</li>
-            <li style='padding: 6px 0;'>Response dynamics and engagement levels</li>
-        </ul>
-    </div>
-    """, unsafe_allow_html=True)
+CARD_GRID_HTML = """
+<div style='display: grid; grid-template-columns: repeat({columns}, 1fr); gap: 1rem;'>
+{cards}
+</div>
+"""
 
-st.markdown("<br><br>", unsafe_allow_html=True)
+FOOTER_HTML = """
+<div style='text-align: center; color: #B3B3B3; padding: 2rem 0; border-top: 1px solid #282828;'>
+    <p style='margin-bottom: 0.5rem;'><strong style='color: #FFFFFF;'>Relaylist</strong> | Built with Streamlit, Natural Language Processing, and Spotify API</p>
+    <p style='font-size: 0.85rem; color: #535353;'>Your data is processed locally and never shared with third parties</p>
+</div>
+"""
+
+@st.cache_resource
+def build_static_html():
+    """Assemble the static header, intro and feature cards into one HTML blob"""
+    how_it_works = "\n".join(
+        STEP_CARD_HTML.format(icon=icon, title=title, description=description)
+        for icon, title, description in HOW_IT_WORKS_CARDS
+    )
+    what_we_analyze = "\n".join(
+        FEATURE_CARD_HTML.format(
+            title=title,
+            items="\n".join(FEATURE_ITEM_HTML.format(item=item) for item in items)
+        )
+        for title, items in WHAT_WE_ANALYZE_CARDS
+    )
+    
+    return "\n".join([
+        HEADER_HTML,
+        INTRO_HTML,
+        SECTION_HEADING_HTML.format(title="How It Works"),
+        CARD_GRID_HTML.format(columns=len(HOW_IT_WORKS_CARDS), cards=how_it_works),
+        "<br><br>",
+        SECTION_HEADING_HTML.format(title="What We Analyze"),
+        CARD_GRID_HTML.format(columns=len(WHAT_WE_ANALYZE_CARDS), cards=what_we_analyze),
+        "<br><br>",
+    ])
+
+@st.cache_data(ttl=30)
+def _cached_sessions(limit=5):
+    """Recent sessions, cached briefly so reruns don't hit the database"""
+    return get_recent_sessions(limit)
+
+# Initialize database
+init_database()
+
+# Initialize session state variables
+if 'analysis_complete' not in st.session_state:
+    st.session_state.analysis_complete = False
+if 'recommendations_ready' not in st.session_state:
+    st.session_state.recommendations_ready = False
+if 'current_session_id' not in st.session_state:
+    st.session_state.current_session_id = None
+if 'spotify_authenticated' not in st.session_state:
+    st.session_state.spotify_authenticated = False
+
+# Static page chrome - emitted once per rerun from a cached blob
+st.markdown(build_static_html(), unsafe_allow_html=True)
 
 # Current status
 if st.session_state.analysis_complete:
@@ -186,6 +199,7 @@ if st.session_state.analysis_complete:
         if st.button("Start New Analysis", use_container_width=True):
             st.session_state.analysis_complete = False
             st.session_state.recommendations_ready = False
+            _cached_sessions.clear()
             st.rerun()
 else:
     st.info("Ready to begin? Navigate to the Upload Chat page using the sidebar to start your analysis.")
@@ -195,14 +209,20 @@ st.markdown("<br><br>", unsafe_allow_html=True)
 # Show previous sessions
 st.markdown("<h3 style='color: #FFFFFF; margin-top: 2rem; margin-bottom: 1.5rem;'>Recent Sessions</h3>", unsafe_allow_html=True)
 
-sessions = get_all_sessions()
+# A new upload invalidates the cached session list
+if st.session_state.pop('sessions_stale', False):
+    _cached_sessions.clear()
+
+sessions = _cached_sessions()
 if sessions:
-    for session in sessions[:5]:
+    for session in sessions:
         with st.expander(f"{session['contact_name']} | {session['filename']} | {session['message_count']} messages"):
             col1, col2 = st.columns([3, 1])
             with col1:
-                st.write(f"**Uploaded:** {session['upload_date']}")
-                st.write(f"**Contact:** {session['contact_name']}")
+                st.markdown(
+                    f"**Uploaded:** {session['upload_date']}  \n"
+                    f"**Contact:** {session['contact_name']}"
+                )
             with col2:
                 if st.button("Load Session", key=f"load_{session['id']}"):
                     st.session_state.current_session_id = session['id']
@@ -213,12 +233,7 @@ else:
 
 # Footer
 st.markdown("<br><br>", unsafe_allow_html=True)
-st.markdown("""
-<div style='text-align: center; color: #B3B3B3; padding: 2rem 0; border-top: 1px solid #282828;'>
-    <p style='margin-bottom: 0.5rem;'><strong style='color: #FFFFFF;'>Relaylist</strong> | Built with Streamlit, Natural Language Processing, and Spotify API</p>
-    <p style='font-size: 0.85rem; color: #535353;'>Your data is processed locally and never shared with third parties</p>
-</div>
-""", unsafe_allow_html=True)
+st.markdown(FOOTER_HTML, unsafe_allow_html=True)
 
 # Sidebar info
 with st.sidebar:
@@ -1,37 +1,68 @@
 """
 Chat Analyzer - Performs NLP analysis on SMS conversations
 """
-import nltk
-from textblob import TextBlob
+import gc
+import re
 from collections import Counter
-import numpy as np
 from datetime import datetime
 
-# Download required NLTK data (run once)
-# Download required NLTK data (run once)
-try:
-    nltk.data.find('tokenizers/punkt_tab')
-except LookupError:
-    nltk.download('punkt_tab')
+# Alphabetic runs of 4+ letters - the only tokens identify_topics keeps
+_WORD_RE = re.compile(r"[^\W\d_]{4,}")
 
-try:
-    nltk.data.find('tokenizers/punkt')
-except LookupError:
-    nltk.download('punkt')
+# Alphabetic runs of any length, used to look up emotion keywords
+_TOKEN_RE = re.compile(r"[^\W\d_]+")
+
+# Variation selectors that follow some emoji (e.g. the one in '❤️')
+_EMOJI_VARIATION_SELECTORS = '\ufe0e\ufe0f'
+
+DAY_NAMES = ('Monday', 'Tuesday', 'Wednesday', 'Thursday',
+             'Friday', 'Saturday', 'Sunday')
+
+# NLTK, TextBlob and numpy are imported lazily so that pages importing this
+# module don't pay their load cost until an analysis actually runs
+_NLTK_READY = False
+
+def _ensure_nltk():
+    """Download required NLTK data (run once per process)"""
+    global _NLTK_READY
+    if _NLTK_READY:
+        return
+    
+    import nltk
+    
+    try:
+        nltk.data.find('corpora/stopwords')
+    except LookupError:
+        nltk.download('stopwords')
     
-try:
-    nltk.data.find('corpora/stopwords')
-except LookupError:
-    nltk.download('stopwords')
+    _NLTK_READY = True
 
-from nltk.corpus import stopwords
-from nltk.tokenize import word_tokenize
+_STOP_WORDS = None
+
+def _get_stop_words():
+    """English stopwords as a frozenset, loaded once and shared by all analyzers"""
+    global _STOP_WORDS
+    if _STOP_WORDS is None:
+        _ensure_nltk()
+        from nltk.corpus import stopwords
+        _STOP_WORDS = frozenset(stopwords.words('english'))
+    return _STOP_WORDS
+
+_SENTIMENT_ANALYZER = None
+
+def get_sentiment_analyzer():
+    """Shared TextBlob PatternAnalyzer, built on first use"""
+    global _SENTIMENT_ANALYZER
+    if _SENTIMENT_ANALYZER is None:
+        from textblob.en.sentiments import PatternAnalyzer
+        _SENTIMENT_ANALYZER = PatternAnalyzer()
+    return _SENTIMENT_ANALYZER
 
 class ChatAnalyzer:
     """Analyzes chat conversations for emotions, sentiment, and topics"""
     
     def __init__(self):
-        self.stop_words = set(stopwords.words('english'))
+        self.stop_words = _get_stop_words()
         
         # Emotion keyword mappings
         self.emotion_keywords = {
@@ -47,6 +78,26 @@ class ChatAnalyzer:
                         'amazing', '😱', '😲'],
             'neutral': ['okay', 'ok', 'fine', 'alright', 'sure', 'maybe']
         }
+        
+        # Flatten the keyword table into O(1) lookups: words are matched
+        # against message tokens, emoji against a single character class.
+        # A keyword can belong to several emotions (e.g. 'amazing').
+        self._emotion_rank = {
+            emotion: rank for rank, emotion in enumerate(self.emotion_keywords)
+        }
+        self._word_to_emotions = {}
+        self._emoji_to_emotions = {}
+        for emotion, keywords in self.emotion_keywords.items():
+            for keyword in keywords:
+                if keyword.isascii():
+                    table = self._word_to_emotions
+                else:
+                    table = self._emoji_to_emotions
+                    keyword = keyword.rstrip(_EMOJI_VARIATION_SELECTORS)
+                table[keyword] = table.get(keyword, ()) + (emotion,)
+        self._emoji_re = re.compile(
+            '[' + ''.join(re.escape(emoji) for emoji in self._emoji_to_emotions) + ']'
+        )
     
     def analyze(self, messages):
         """
@@ -58,14 +109,27 @@ class ChatAnalyzer:
         Returns:
             dict: Complete analysis results
         """
-        # Extract text content
-        all_text = ' '.join([m['content'] for m in messages])
+        # The analysis allocates many short-lived, acyclic objects (tokens,
+        # per-message dicts), so pause the cyclic GC instead of letting it
+        # sweep repeatedly mid-run
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            return self._analyze(messages)
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+    
+    def _analyze(self, messages):
+        """Run every analysis over the messages and build the summary"""
+        # Walk the messages once and share the per-message results
+        message_data = self._single_pass(messages)
         
         # Perform analyses
-        emotions = self.extract_emotions(messages)
-        sentiment = self.analyze_sentiment(messages)
-        topics = self.identify_topics(messages)
-        temporal_patterns = self.analyze_temporal_patterns(messages)
+        emotions = self.extract_emotions(messages, message_data)
+        sentiment = self.analyze_sentiment(messages, message_data)
+        topics = self.identify_topics(messages, message_data=message_data)
+        temporal_patterns = self.analyze_temporal_patterns(messages, message_data)
         
         # Generate summary
         summary = self.generate_summary({
@@ -84,76 +148,131 @@ class ChatAnalyzer:
             'summary': summary
         }
     
-    def extract_emotions(self, messages):
+    def _single_pass(self, messages):
         """
-        Extract emotional content from messages
+        Iterate over messages once, collecting the per-message values used by
+        the individual analysis methods
         
         Returns:
-            dict: Emotion scores and distribution
+            dict: Emotion counts plus pre-sized arrays indexed by message
         """
+        import numpy as np
+        
+        sentiment_analyzer = get_sentiment_analyzer()
+        word_to_emotions = self._word_to_emotions
+        emoji_to_emotions = self._emoji_to_emotions
+        emoji_re = self._emoji_re
+        emotion_rank = self._emotion_rank
+        
+        n = len(messages)
+        lowered = []
         emotion_counts = Counter()
         message_emotions = []
+        polarities = np.empty(n, dtype=np.float64)
+        subjectivities = np.empty(n, dtype=np.float64)
+        hours = np.empty(n, dtype=np.int64)
+        weekdays = np.empty(n, dtype=np.int64)
         
-        for message in messages:
-            text = message['content'].lower()
-            msg_emotions = []
+        for i, message in enumerate(messages):
+            content = message['content']
+            text = content.lower()
+            lowered.append(text)
             
-            # Check for emotion keywords
-            for emotion, keywords in self.emotion_keywords.items():
-                for keyword in keywords:
-                    if keyword in text:
-                        emotion_counts[emotion] += 1
-                        msg_emotions.append(emotion)
+            # Check for emotion keywords (each distinct keyword counts once)
+            matched = [
+                emotion
+                for word in set(_TOKEN_RE.findall(text))
+                for emotion in word_to_emotions.get(word, ())
+            ]
+            if not text.isascii():
+                matched.extend(
+                    emotion
+                    for emoji in set(emoji_re.findall(text))
+                    for emotion in emoji_to_emotions[emoji]
+                )
             
-            # If no emotion found, mark as neutral
-            if not msg_emotions:
+            if matched:
+                # Table order, not set order, so counts are inserted the same
+                # way on every run regardless of the hash seed
+                matched.sort(key=emotion_rank.__getitem__)
+                emotion_counts.update(matched)
+                primary_emotion = matched[0]
+            else:
+                # If no emotion found, mark as neutral
                 emotion_counts['neutral'] += 1
-                msg_emotions.append('neutral')
+                primary_emotion = 'neutral'
             
-            message_emotions.append(msg_emotions[0])  # Primary emotion
+            message_emotions.append(primary_emotion)
+            
+            # Call the analyzer directly instead of wrapping each message in a TextBlob
+            sentiment = sentiment_analyzer.analyze(content)
+            polarities[i] = sentiment.polarity  # -1 to 1
+            subjectivities[i] = sentiment.subjectivity  # 0 to 1
+            
+            timestamp = message['timestamp']
+            hours[i] = timestamp.hour
+            weekdays[i] = timestamp.weekday()
+        
+        return {
+            'lowered': lowered,
+            'emotion_counts': emotion_counts,
+            'message_emotions': message_emotions,
+            'polarities': polarities,
+            'subjectivities': subjectivities,
+            'hours': hours,
+            'weekdays': weekdays
+        }
+    
+    def extract_emotions(self, messages, message_data=None):
+        """
+        Extract emotional content from messages
+        
+        Returns:
+            dict: Emotion scores and distribution
+        """
+        if message_data is None:
+            message_data = self._single_pass(messages)
+        
+        emotion_counts = message_data['emotion_counts']
         
         # Calculate percentages
-        total = sum(emotion_counts.values())
+        scale = 100.0 / sum(emotion_counts.values())
         emotion_percentages = {
-            emotion: (count / total) * 100 
+            emotion: count * scale
             for emotion, count in emotion_counts.items()
         }
         
-        # Find dominant emotion
-        dominant = max(emotion_counts.items(), key=lambda x: x[1])[0]
+        # Find dominant emotion (ties go to the first emotion encountered)
+        dominant = emotion_counts.most_common(1)[0][0]
         
         return {
             'counts': dict(emotion_counts),
             'percentages': emotion_percentages,
+            # Most frequent first, so display code doesn't re-sort per render
+            'sorted_percentages': sorted(emotion_percentages.items(), key=lambda x: -x[1]),
             'dominant': dominant,
-            'message_emotions': message_emotions,
+            'message_emotions': message_data['message_emotions'],
             'total_analyzed': len(messages)
         }
     
-    def analyze_sentiment(self, messages):
+    def analyze_sentiment(self, messages, message_data=None):
         """
         Analyze sentiment polarity and subjectivity over time
         
         Returns:
             dict: Sentiment scores and trends
         """
-        sentiments = []
+        import numpy as np
         
-        for message in messages:
-            blob = TextBlob(message['content'])
-            sentiments.append({
-                'timestamp': message['timestamp'],
-                'polarity': blob.sentiment.polarity,  # -1 to 1
-                'subjectivity': blob.sentiment.subjectivity,  # 0 to 1
-                'sender': message['sender']
-            })
+        if message_data is None:
+            message_data = self._single_pass(messages)
         
-        # Calculate averages
-        polarities = [s['polarity'] for s in sentiments]
-        subjectivities = [s['subjectivity'] for s in sentiments]
+        polarities = message_data['polarities']
+        subjectivities = message_data['subjectivities']
         
-        avg_polarity = np.mean(polarities)
-        avg_subjectivity = np.mean(subjectivities)
+        # Calculate averages directly on the preallocated arrays
+        avg_polarity = float(polarities.mean())
+        avg_subjectivity = float(subjectivities.mean())
         
         # Determine sentiment label
         if avg_polarity > 0.1:
@@ -163,14 +282,29 @@ class ChatAnalyzer:
         else:
             sentiment_label = 'Neutral'
         
-        # Calculate trend (simple linear regression slope)
-        if len(sentiments) > 1:
-            x = np.arange(len(polarities))
-            trend = np.polyfit(x, polarities, 1)[0]
+        # Calculate trend (simple linear regression slope, closed form:
+        # sum((x - x_mean) * (y - y_mean)) / sum((x - x_mean) ** 2))
+        n = len(polarities)
+        if n > 1:
+            x_centered = np.arange(n) - (n - 1) / 2
+            trend = float(np.dot(x_centered, polarities - avg_polarity)) / (n * (n * n - 1) / 12)
             trend_direction = 'Improving' if trend > 0.01 else 'Declining' if trend < -0.01 else 'Stable'
         else:
             trend_direction = 'Stable'
         
+        # Per-message timeline, built last from the finished arrays
+        sentiments = [
+            {
+                'timestamp': message['timestamp'],
+                'polarity': polarity,
+                'subjectivity': subjectivity,
+                'sender': message['sender']
+            }
+            for message, polarity, subjectivity in zip(
+                messages, polarities.tolist(), subjectivities.tolist()
+            )
+        ]
+        
         return {
             'average_polarity': round(avg_polarity, 3),
             'average_subjectivity': round(avg_subjectivity, 3),
@@ -180,25 +314,25 @@ class ChatAnalyzer:
             'count': len(messages)
         }
     
-    def identify_topics(self, messages, top_n=10):
+    def identify_topics(self, messages, top_n=10, message_data=None):
         """
         Identify key topics using word frequency analysis
         
         Returns:
             dict: Top topics and keywords
         """
-        # Combine all message content
-        all_text = ' '.join([m['content'].lower() for m in messages])
-        
-        # Tokenize and remove stopwords
-        tokens = word_tokenize(all_text)
+        # Combine all message content, reusing the lowercased text if available
+        if message_data is not None:
+            lowered = message_data['lowered']
+        else:
+            lowered = [m['content'].lower() for m in messages]
+        all_text = ' '.join(lowered)
         
-        # Filter tokens (remove stopwords, short words, and punctuation)
+        # Tokenize into alphabetic words of 4+ letters and remove stopwords
+        stop_words = self.stop_words
         filtered_tokens = [
-            word for word in tokens 
-            if word.isalpha() 
-            and len(word) > 3 
-            and word not in self.stop_words
+            word for word in _WORD_RE.findall(all_text)
+            if word not in stop_words
         ]
         
         # Count word frequencies
@@ -206,9 +340,7 @@ class ChatAnalyzer:
         top_words = word_freq.most_common(top_n)
         
         # Identify potential topics (bigrams)
-        from nltk import bigrams
-        bigram_list = list(bigrams(filtered_tokens))
-        bigram_freq = Counter(bigram_list)
+        bigram_freq = Counter(zip(filtered_tokens, filtered_tokens[1:]))
         top_bigrams = bigram_freq.most_common(5)
         
         # Format bigrams
@@ -224,35 +356,41 @@ class ChatAnalyzer:
             'total_words': len(filtered_tokens)
         }
     
-    def analyze_temporal_patterns(self, messages):
+    def analyze_temporal_patterns(self, messages, message_data=None):
         """
         Analyze messaging patterns over time
         
         Returns:
             dict: Temporal patterns and statistics
         """
+        import numpy as np
+        
+        if message_data is None:
+            message_data = self._single_pass(messages)
+        
         # Group by hour of day
-        hour_counts = Counter()
-        for message in messages:
-            hour = message['timestamp'].hour
-            hour_counts[hour] += 1
+        hour_counts = np.bincount(message_data['hours'], minlength=24)
         
         # Find peak hours
-        peak_hour = max(hour_counts.items(), key=lambda x: x[1])[0]
+        peak_hour = int(hour_counts.argmax())
         
-        # Group by day of week
-        day_counts = Counter()
-        for message in messages:
-            day = message['timestamp'].strftime('%A')
-            day_counts[day] += 1
+        # Group by day of week (Monday = 0)
+        day_counts = np.bincount(message_data['weekdays'], minlength=7)
         
-        most_active_day = max(day_counts.items(), key=lambda x: x[1])[0]
+        most_active_day = DAY_NAMES[int(day_counts.argmax())]
         
         return {
-            'hourly_distribution': dict(hour_counts),
+            'hourly_distribution': {
+                hour: count for hour, count in enumerate(hour_counts.tolist()) if count
+            },
             'peak_hour': peak_hour,
-            'daily_distribution': dict(day_counts),
-            'most_active_day': most_active_day
+            'daily_distribution': {
+                DAY_NAMES[day]: count for day, count in enumerate(day_counts.tolist()) if count
+            },
+            'most_active_day': most_active_day,
+            # Dense per-hour (0-23) and per-day (Monday-Sunday) counts for plotting
+            'hourly_counts': hour_counts.tolist(),
+            'daily_counts': day_counts.tolist()
         }
     
     def generate_summary(self, analysis_data):
@@ -1,7 +1,97 @@
 """
 Music Recommender - Combines NLP chat analysis with user preferences
 """
+import functools
+import heapq
 import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from types import MappingProxyType
+from typing import Optional
+import numpy as np
+
+# Column order of the audio features used for scoring
+FEATURE_ORDER = ('valence', 'energy', 'danceability', 'acousticness',
+                 'instrumentalness', 'loudness', 'tempo')
+
+# Per-column (offset, scale) mapping raw Spotify values onto 0..1:
+# loudness is roughly -40..0 dB and tempo 0..220 BPM
+FEATURE_OFFSETS = np.array([0, 0, 0, 0, 0, 40, 0], dtype=float)
+FEATURE_SCALES = np.array([1, 1, 1, 1, 1, 40, 220], dtype=float)
+
+# A user's medium-term top artists/tracks only drift over days, so reuse them
+# across recommender instances for a while: (user_id, kind) -> (fetched_at, response).
+# Oldest entries are evicted past TOP_ITEMS_MAX_ENTRIES; expired ones on lookup.
+TOP_ITEMS_TTL = 3600
+TOP_ITEMS_MAX_ENTRIES = 128
+_top_items_cache = {}
+_top_items_lock = threading.Lock()
+
+# Emotion -> (feature, threshold, match above threshold?, detail) used to
+# explain why a well-scoring track fits the mood
+REASON_TRIGGERS = MappingProxyType({
+    'joy': ('valence', 0.6, True, "upbeat and positive vibe"),
+    'sadness': ('valence', 0.4, False, "melancholic tone"),
+    'anger': ('energy', 0.7, True, "high energy and intensity")
+})
+
+# (score > 0.8, emotion whose trigger matched or None) -> explanation
+REASON_MESSAGES = MappingProxyType({
+    (True, None): "Perfect emotional match",
+    (False, None): "Strong emotional match",
+    **{(True, emotion): f"Perfect match - {trigger[3]}" for emotion, trigger in REASON_TRIGGERS.items()},
+    **{(False, emotion): f"Great match - {trigger[3]}" for emotion, trigger in REASON_TRIGGERS.items()}
+})
+
+
+def _build_feature_tables(emotion_features):
+    """
+    Flatten {emotion: {feature: (min, max)}} into an emotion -> row index and
+    read-only (n_emotions, n_features) min/max arrays ordered by FEATURE_ORDER
+    """
+    index = {emotion: idx for idx, emotion in enumerate(emotion_features)}
+    mins = np.full((len(emotion_features), len(FEATURE_ORDER)), np.nan)
+    maxs = np.full((len(emotion_features), len(FEATURE_ORDER)), np.nan)
+    for emotion, targets in emotion_features.items():
+        for feature_name, (min_val, max_val) in targets.items():
+            row = index[emotion]
+            col = FEATURE_ORDER.index(feature_name)
+            mins[row, col] = min_val
+            maxs[row, col] = max_val
+    mins.setflags(write=False)
+    maxs.setflags(write=False)
+    return MappingProxyType(index), mins, maxs
+
+
+@dataclass
+class Track:
+    """A candidate Spotify track and its scoring results"""
+    id: str
+    name: str
+    artist: str
+    album: str
+    spotify_url: str
+    preview_url: Optional[str]
+    duration_ms: int
+    popularity: int
+    genre_source: str
+    emotion_match: str
+    image_url: Optional[str]
+    audio_features: dict = field(default_factory=dict)
+    relevance_score: float = 0.5
+    emotion_match_score: Optional[float] = None
+    reason: Optional[str] = None
+    
+    def to_dict(self):
+        """Plain dict for the pages and database, leaving out unset scoring fields"""
+        data = asdict(self)
+        for key in ('emotion_match_score', 'reason'):
+            if data[key] is None:
+                del data[key]
+        return data
+
 
 class MusicRecommender:
     """
@@ -11,49 +101,72 @@ class MusicRecommender:
     3. Spotify's recommendation algorithm
     """
     
+    # Search keywords per emotion for the genre-based fallback
+    SEARCH_TERMS = MappingProxyType({
+        'joy': ('happy', 'upbeat', 'cheerful', 'positive'),
+        'sadness': ('sad', 'melancholy', 'emotional', 'heartbreak'),
+        'anger': ('intense', 'aggressive', 'powerful', 'energy'),
+        'surprise': ('exciting', 'dynamic', 'unexpected'),
+        'neutral': ('chill', 'relaxed', 'calm', 'smooth')
+    })
+    
+    # Emotion to Spotify audio feature mapping (all ranges on a 0..1 scale)
+    EMOTION_FEATURES = MappingProxyType({
+        'joy': MappingProxyType({
+            'valence': (0.6, 1.0),      # Happy
+            'energy': (0.5, 0.9),        # Moderate to high energy
+            'danceability': (0.5, 1.0),  # Danceable
+            'acousticness': (0.0, 0.5)   # Not too acoustic
+        }),
+        'sadness': MappingProxyType({
+            'valence': (0.0, 0.4),       # Sad
+            'energy': (0.2, 0.5),        # Low energy
+            'acousticness': (0.3, 1.0),  # More acoustic
+            'instrumentalness': (0.0, 0.7)
+        }),
+        'anger': MappingProxyType({
+            'valence': (0.0, 0.5),       # Negative
+            'energy': (0.7, 1.0),        # High energy
+            'loudness': (0.875, 1.0),    # Loud (-5..0 dB)
+            'tempo': (0.545, 0.818)      # Fast (120..180 BPM)
+        }),
+        'surprise': MappingProxyType({
+            'valence': (0.4, 0.8),
+            'energy': (0.6, 0.9),
+            'danceability': (0.4, 0.8)
+        }),
+        'neutral': MappingProxyType({
+            'valence': (0.4, 0.6),       # Balanced
+            'energy': (0.4, 0.6)         # Medium
+        }),
+        'chill': MappingProxyType({
+            'valence': (0.4, 0.7),
+            'energy': (0.2, 0.5),
+            'acousticness': (0.3, 0.8),
+            'tempo': (0.273, 0.545)      # 60..120 BPM
+        })
+    })
+    
+    # Flattened (emotion, feature) tables of target range bounds for
+    # vectorized scoring; NaN marks features an emotion doesn't target
+    _emotion_index, _emotion_mins, _emotion_maxs = _build_feature_tables(EMOTION_FEATURES)
+    
     def __init__(self, spotify_client):
         """
         Args:
-            spotify_client: Authenticated Spotify client (spotipy)
+            spotify_client: Authenticated SpotifyClient (services.spotify_client)
         """
-        self.sp = spotify_client
+        self.sp = spotify_client.sp
+        
+        # Every API call goes through the client's shared rate limiter and
+        # 429/5xx retry
+        self._call = spotify_client.call_with_retry
         
-        # Emotion to Spotify audio feature mapping
-        self.emotion_features = {
-            'joy': {
-                'valence': (0.6, 1.0),      # Happy
-                'energy': (0.5, 0.9),        # Moderate to high energy
-                'danceability': (0.5, 1.0),  # Danceable
-                'acousticness': (0.0, 0.5)   # Not too acoustic
-            },
-            'sadness': {
-                'valence': (0.0, 0.4),       # Sad
-                'energy': (0.2, 0.5),        # Low energy
-                'acousticness': (0.3, 1.0),  # More acoustic
-                'instrumentalness': (0.0, 0.7)
-            },
-            'anger': {
-                'valence': (0.0, 0.5),       # Negative
-                'energy': (0.7, 1.0),        # High energy
-                'loudness': (-5, 0),         # Loud
-                'tempo': (120, 180)          # Fast
-            },
-            'surprise': {
-                'valence': (0.4, 0.8),
-                'energy': (0.6, 0.9),
-                'danceability': (0.4, 0.8)
-            },
-            'neutral': {
-                'valence': (0.4, 0.6),       # Balanced
-                'energy': (0.4, 0.6)         # Medium
-            },
-            'chill': {
-                'valence': (0.4, 0.7),
-                'energy': (0.2, 0.5),
-                'acousticness': (0.3, 0.8),
-                'tempo': (60, 120)
-            }
-        }
+        # Per-instance memo of seed name -> Spotify ID lookups (bound here so
+        # `self` isn't part of the cache key)
+        self._resolve_artist_id = functools.lru_cache(maxsize=512)(self._search_artist_id)
+        self._resolve_track_id = functools.lru_cache(maxsize=512)(self._search_track_id)
+        self._current_user_id = functools.lru_cache(maxsize=1)(self._fetch_current_user_id)
     
     def generate_recommendations(self, chat_analysis, user_preferences, limit=20):
         """
@@ -65,22 +178,24 @@ class MusicRecommender:
             limit: Number of tracks to recommend
             
         Returns:
-            list: Recommended tracks with relevance scores
+            list: Recommended track dicts with relevance scores
         """
         method = user_preferences['method']
         
         if method == 'genre_selection':
-            return self._recommend_by_genre(chat_analysis, user_preferences, limit)
+            tracks = self._recommend_by_genre(chat_analysis, user_preferences, limit)
         
         elif method == 'spotify_profile':
-            return self._recommend_by_profile(chat_analysis, user_preferences, limit)
+            tracks = self._recommend_by_profile(chat_analysis, user_preferences, limit)
         
         elif method == 'seed_input':
-            return self._recommend_by_seeds(chat_analysis, user_preferences, limit)
+            tracks = self._recommend_by_seeds(chat_analysis, user_preferences, limit)
         
         else:
             # Fallback to genre-based
-            return self._recommend_by_genre(chat_analysis, user_preferences, limit)
+            tracks = self._recommend_by_genre(chat_analysis, user_preferences, limit)
+        
+        return [track.to_dict() for track in tracks]
     
     def _recommend_by_genre(self, chat_analysis, user_prefs, limit):
         """
@@ -95,63 +210,67 @@ class MusicRecommender:
         
         if not user_genres:
             from utils.music_preferences import MusicPreferenceCapture
-            pref_capture = MusicPreferenceCapture()
-            user_genres = pref_capture.get_genre_suggestions_from_emotion(emotion)
+            user_genres = MusicPreferenceCapture.get_genre_suggestions_from_emotion(emotion)
         
         recommendations = []
         
         # Use search instead of recommendations API
         # Create search queries based on emotion and genre
-        search_terms = {
-            'joy': ['happy', 'upbeat', 'cheerful', 'positive'],
-            'sadness': ['sad', 'melancholy', 'emotional', 'heartbreak'],
-            'anger': ['intense', 'aggressive', 'powerful', 'energy'],
-            'surprise': ['exciting', 'dynamic', 'unexpected'],
-            'neutral': ['chill', 'relaxed', 'calm', 'smooth']
-        }
-        
-        emotion_terms = search_terms.get(emotion, search_terms['neutral'])
+        emotion_terms = self.SEARCH_TERMS.get(emotion, self.SEARCH_TERMS['neutral'])
         
         # Search for tracks
         try:
-            for genre in user_genres[:3]:
-                for term in emotion_terms[:2]:  # Use 2 terms per genre
-                    query = f"{term} {genre}"
-                    results = self.sp.search(q=query, type='track', limit=5)
-                    
-                    if results and 'tracks' in results and 'items' in results['tracks']:
-                        for track in results['tracks']['items']:
-                            # Avoid duplicates
-                            if not any(r['id'] == track['id'] for r in recommendations):
-                                recommendations.append(self._format_track(track, genre, emotion))
-                    
-                    if len(recommendations) >= limit:
-                        break
+            # Use 2 terms per genre; the searches are independent HTTP calls,
+            # so issue them concurrently and merge in query order
+            queries = [
+                (genre, f"{term} {genre}")
+                for genre in user_genres[:3]
+                for term in emotion_terms[:2]
+            ]
+            
+            with ThreadPoolExecutor(max_workers=max(len(queries), 1)) as executor:
+                search_results = list(executor.map(
+                    lambda query: self._call(self.sp.search, q=query[1], type='track', limit=5),
+                    queries
+                ))
+            
+            seen_ids = set()
+            for (genre, _), results in zip(queries, search_results):
+                if results and 'tracks' in results and 'items' in results['tracks']:
+                    for track in results['tracks']['items']:
+                        # Avoid duplicates
+                        if track['id'] in seen_ids:
+                            continue
+                        seen_ids.add(track['id'])
+                        recommendations.append(self._format_track(track, genre, emotion))
                 
                 if len(recommendations) >= limit:
                     break
             
-            # Get audio features for scoring (if available)
+            # Get audio features for scoring (if available) in one batched
+            # request, but don't fail if they are not available
+            candidates = recommendations[:limit]
+            try:
+                features_list = self._call(self.sp.audio_features, [track.id for track in candidates])
+            except:
+                features_list = None
+            if not features_list:
+                features_list = [None] * len(candidates)
+            
             scored_recs = []
-            for track in recommendations[:limit]:
-                # Try to get audio features, but don't fail if not available
-                try:
-                    features = self.sp.audio_features([track['id']])
-                    if features and features[0]:
-                        track['audio_features'] = features[0]
-                        # Simple scoring based on popularity
-                        track['relevance_score'] = track['popularity'] / 100
-                    else:
-                        track['audio_features'] = {}
-                        track['relevance_score'] = 0.7  # Default score
-                except:
-                    track['audio_features'] = {}
-                    track['relevance_score'] = 0.7
+            for track, features in zip(candidates, features_list):
+                if features:
+                    track.audio_features = features
+                    # Simple scoring based on popularity
+                    track.relevance_score = track.popularity / 100
+                else:
+                    track.audio_features = {}
+                    track.relevance_score = 0.7  # Default score
                 
-                track['reason'] = f"Matches {emotion} mood and {track['genre_source']} genre"
+                track.reason = f"Matches {emotion} mood and {track.genre_source} genre"
                 scored_recs.append(track)
             
-            return sorted(scored_recs, key=lambda x: x.get('relevance_score', 0.5), reverse=True)[:limit]
+            return heapq.nlargest(limit, scored_recs, key=lambda x: x.relevance_score)
             
         except Exception as e:
             print(f"Error in search-based recommendations: {e}")
@@ -166,27 +285,25 @@ class MusicRecommender:
         sentiment = chat_analysis['sentiment']['average_polarity']
         
         try:
-            # Get user's top artists
-            top_artists = self.sp.current_user_top_artists(
-                limit=5,
-                time_range='medium_term'  # Last 6 months
-            )
-            
-            # Get user's top tracks
-            top_tracks = self.sp.current_user_top_tracks(
-                limit=5,
-                time_range='medium_term'
-            )
+            # Get user's top artists and tracks concurrently (resolving the
+            # user first so both fetches share the memoised id)
+            self._current_user_id()
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                artists_future = executor.submit(self._get_top_items, 'artists')
+                tracks_future = executor.submit(self._get_top_items, 'tracks')
+            top_artists = artists_future.result()
+            top_tracks = tracks_future.result()
             
             # Extract artist and track IDs as seeds
             seed_artists = [artist['id'] for artist in top_artists['items'][:2]]
             seed_tracks = [track['id'] for track in top_tracks['items'][:2]]
             
             # Get audio feature targets
-            feature_targets = self.emotion_features.get(emotion, self.emotion_features['neutral'])
+            feature_targets = self.EMOTION_FEATURES.get(emotion, self.EMOTION_FEATURES['neutral'])
             
             # Get recommendations based on user's actual taste + emotion
-            results = self.sp.recommendations(
+            results = self._call(
+                self.sp.recommendations,
                 seed_artists=seed_artists,
                 seed_tracks=seed_tracks,
                 limit=limit,
@@ -205,7 +322,7 @@ class MusicRecommender:
                 user_prefs
             )
             
-            return sorted(scored_recs, key=lambda x: x['relevance_score'], reverse=True)[:limit]
+            return heapq.nlargest(limit, scored_recs, key=lambda x: x.relevance_score)
             
         except Exception as e:
             print(f"Error with profile-based recommendations: {e}")
@@ -219,36 +336,27 @@ class MusicRecommender:
         emotion = chat_analysis['emotions']['dominant']
         sentiment = chat_analysis['sentiment']['average_polarity']
         
-        seed_artists = []
-        seed_tracks = []
+        # Resolve artist and track names to IDs (all lookups run concurrently)
+        artist_names = user_prefs.get('artists', [])
+        track_names = user_prefs.get('tracks', [])
         
-        # Search for artist IDs
-        for artist_name in user_prefs.get('artists', []):
-            try:
-                results = self.sp.search(q=f'artist:{artist_name}', type='artist', limit=1)
-                if results['artists']['items']:
-                    seed_artists.append(results['artists']['items'][0]['id'])
-            except:
-                continue
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            artist_futures = [executor.submit(self._resolve_artist_id, name) for name in artist_names]
+            track_futures = [executor.submit(self._resolve_track_id, name) for name in track_names]
         
-        # Search for track IDs
-        for track_name in user_prefs.get('tracks', []):
-            try:
-                results = self.sp.search(q=track_name, type='track', limit=1)
-                if results['tracks']['items']:
-                    seed_tracks.append(results['tracks']['items'][0]['id'])
-            except:
-                continue
+        seed_artists = self._collect_ids(artist_futures)
+        seed_tracks = self._collect_ids(track_futures)
         
         if not seed_artists and not seed_tracks:
             # No valid seeds found, fallback
             return self._recommend_by_genre(chat_analysis, user_prefs, limit)
         
         # Get recommendations
-        feature_targets = self.emotion_features.get(emotion, self.emotion_features['neutral'])
+        feature_targets = self.EMOTION_FEATURES.get(emotion, self.EMOTION_FEATURES['neutral'])
         
         try:
-            results = self.sp.recommendations(
+            results = self._call(
+                self.sp.recommendations,
                 seed_artists=seed_artists[:2],  # Max 2 artists
                 seed_tracks=seed_tracks[:3],    # Max 3 tracks (Spotify allows 5 total seeds)
                 limit=limit,
@@ -266,27 +374,91 @@ class MusicRecommender:
                 user_prefs
             )
             
-            return sorted(scored_recs, key=lambda x: x['relevance_score'], reverse=True)[:limit]
+            return heapq.nlargest(limit, scored_recs, key=lambda x: x.relevance_score)
             
         except Exception as e:
             print(f"Error with seed-based recommendations: {e}")
             return []
     
+    def _fetch_current_user_id(self):
+        """Look up the Spotify ID of the authenticated user"""
+        return self._call(self.sp.me)['id']
+    
+    def _get_top_items(self, kind):
+        """
+        Fetch the user's top 'artists' or 'tracks', reusing a response
+        fetched within the last TOP_ITEMS_TTL seconds
+        """
+        key = (self._current_user_id(), kind)
+        now = time.monotonic()
+        with _top_items_lock:
+            cached = _top_items_cache.get(key)
+            if cached:
+                if now - cached[0] < TOP_ITEMS_TTL:
+                    return cached[1]
+                del _top_items_cache[key]
+        
+        if kind == 'artists':
+            fetch = self.sp.current_user_top_artists
+        else:
+            fetch = self.sp.current_user_top_tracks
+        response = self._call(
+            fetch,
+            limit=5,
+            time_range='medium_term'  # Last 6 months
+        )
+        with _top_items_lock:
+            # Re-insert so dict order stays oldest-first, then trim the oldest
+            _top_items_cache.pop(key, None)
+            _top_items_cache[key] = (now, response)
+            while len(_top_items_cache) > TOP_ITEMS_MAX_ENTRIES:
+                del _top_items_cache[next(iter(_top_items_cache))]
+        return response
+    
+    def _search_artist_id(self, artist_name):
+        """Look up the Spotify ID of the best matching artist (None if no match)"""
+        results = self._call(self.sp.search, q=f'artist:{artist_name}', type='artist', limit=1)
+        items = results['artists']['items']
+        return items[0]['id'] if items else None
+    
+    def _search_track_id(self, track_name):
+        """Look up the Spotify ID of the best matching track (None if no match)"""
+        results = self._call(self.sp.search, q=track_name, type='track', limit=1)
+        items = results['tracks']['items']
+        return items[0]['id'] if items else None
+    
+    def _collect_ids(self, futures):
+        """
+        Gather resolved Spotify IDs, skipping lookups that failed or didn't match
+        
+        Failed lookups raise out of the cached resolver, so they are retried
+        on the next call rather than cached as misses
+        """
+        ids = []
+        for future in futures:
+            try:
+                spotify_id = future.result()
+            except:
+                continue
+            if spotify_id:
+                ids.append(spotify_id)
+        return ids
+    
     def _format_track(self, track, genre, emotion):
         """Format Spotify track object into our structure"""
-        return {
-            'id': track['id'],
-            'name': track['name'],
-            'artist': ', '.join([artist['name'] for artist in track['artists']]),
-            'album': track['album']['name'],
-            'spotify_url': track['external_urls']['spotify'],
-            'preview_url': track.get('preview_url'),
-            'duration_ms': track['duration_ms'],
-            'popularity': track['popularity'],
-            'genre_source': genre,
-            'emotion_match': emotion,
-            'image_url': track['album']['images'][0]['url'] if track['album']['images'] else None
-        }
+        return Track(
+            id=track['id'],
+            name=track['name'],
+            artist=', '.join([artist['name'] for artist in track['artists']]),
+            album=track['album']['name'],
+            spotify_url=track['external_urls']['spotify'],
+            preview_url=track.get('preview_url'),
+            duration_ms=track['duration_ms'],
+            popularity=track['popularity'],
+            genre_source=genre,
+            emotion_match=emotion,
+            image_url=track['album']['images'][0]['url'] if track['album']['images'] else None
+        )
     
     def _score_recommendations(self, tracks, chat_analysis, user_prefs):
         """
@@ -299,96 +471,100 @@ class MusicRecommender:
         sentiment = chat_analysis['sentiment']['average_polarity']
         
         # Get audio features for all tracks
-        track_ids = [t['id'] for t in tracks]
+        track_ids = [t.id for t in tracks]
         
         try:
-            audio_features = self.sp.audio_features(track_ids)
+            audio_features = self._call(self.sp.audio_features, track_ids)
         except:
             audio_features = [None] * len(track_ids)
         
-        scored_tracks = []
+        # Only tracks with audio features can be scored
+        scored = [
+            (track, features)
+            for track, features in zip(tracks, audio_features)
+            if features
+        ]
         
-        for track, features in zip(tracks, audio_features):
-            if not features:
-                track['relevance_score'] = 0.5
-                track['audio_features'] = {}
-                scored_tracks.append(track)
-                continue
-            
-            # Calculate emotion match score
-            target_features = self.emotion_features.get(emotion, self.emotion_features['neutral'])
+        if scored:
+            # Calculate emotion match scores for all tracks at once from an
+            # (n_tracks, n_features) matrix, NaN where a feature is missing
+            row = self._emotion_index.get(emotion, self._emotion_index['neutral'])
+            mins = self._emotion_mins[row]
+            maxs = self._emotion_maxs[row]
+            values = np.array([
+                [np.nan if features.get(name) is None else features[name] for name in FEATURE_ORDER]
+                for _, features in scored
+            ], dtype=float)
+            present = ~np.isnan(values) & ~np.isnan(mins)
             
-            emotion_score = 0
-            feature_count = 0
+            # Normalize every feature onto 0..1 so one distance formula fits all
+            values = np.clip((values + FEATURE_OFFSETS) / FEATURE_SCALES, 0.0, 1.0)
             
-            for feature_name, target_range in target_features.items():
-                if feature_name in features and features[feature_name] is not None:
-                    value = features[feature_name]
-                    min_val, max_val = target_range
-                    
-                    # Calculate how well the value fits in the target range
-                    if min_val <= value <= max_val:
-                        emotion_score += 1.0
-                    else:
-                        # Penalize based on distance from range
-                        if value < min_val:
-                            distance = (min_val - value) / min_val if min_val != 0 else 1
-                        else:
-                            distance = (value - max_val) / (1 - max_val) if max_val != 1 else 1
-                        emotion_score += max(0, 1 - distance)
-                    
-                    feature_count += 1
+            # Penalize based on distance from range; on a 0..1 scale a value
+            # can only be below a non-zero min or above a max below 1
+            with np.errstate(divide='ignore', invalid='ignore'):
+                below = (mins - values) / mins
+                above = (values - maxs) / (1 - maxs)
+            feature_scores = np.where(
+                values < mins, np.maximum(0, 1 - below),
+                np.where(values > maxs, np.maximum(0, 1 - above), 1.0)
+            )
             
-            emotion_score = emotion_score / feature_count if feature_count > 0 else 0.5
+            feature_counts = present.sum(axis=1)
+            emotion_scores = np.where(
+                feature_counts > 0,
+                np.where(present, feature_scores, 0.0).sum(axis=1) / np.maximum(feature_counts, 1),
+                0.5
+            )
             
             # Popularity score (prefer somewhat popular but not too mainstream)
-            popularity = track['popularity']
+            popularity = np.array([track.popularity for track, _ in scored], dtype=float)
             if user_prefs.get('popularity_range'):
                 min_pop, max_pop = user_prefs['popularity_range']
-                if min_pop <= popularity <= max_pop:
-                    popularity_score = 1.0
-                else:
-                    popularity_score = 0.5
+                popularity_scores = np.where((popularity >= min_pop) & (popularity <= max_pop), 1.0, 0.5)
             else:
                 # Default: prefer moderate popularity
-                popularity_score = 1 - abs(popularity - 60) / 60
+                popularity_scores = 1 - np.abs(popularity - 60) / 60
             
             # Final score: weighted combination
-            relevance_score = (
-                emotion_score * 0.6 +      # 60% emotion match
-                popularity_score * 0.4     # 40% popularity
-            )
-            
-            track['relevance_score'] = relevance_score
-            track['audio_features'] = features
-            track['emotion_match_score'] = emotion_score
-            
-            # Add explanation
-            track['reason'] = self._generate_recommendation_reason(
-                emotion, features, emotion_score
+            relevance_scores = (
+                emotion_scores * 0.6 +      # 60% emotion match
+                popularity_scores * 0.4     # 40% popularity
             )
             
+            for (track, features), emotion_score, relevance_score in zip(
+                scored, emotion_scores.tolist(), relevance_scores.tolist()
+            ):
+                track.relevance_score = relevance_score
+                track.audio_features = features
+                track.emotion_match_score = emotion_score
+                
+                # Add explanation
+                track.reason = self._generate_recommendation_reason(
+                    emotion, features, emotion_score
+                )
+        
+        scored_tracks = []
+        for track, features in zip(tracks, audio_features):
+            if not features:
+                track.relevance_score = 0.5
+                track.audio_features = {}
             scored_tracks.append(track)
         
         return scored_tracks
     
     def _generate_recommendation_reason(self, emotion, features, score):
         """Generate human-readable explanation for recommendation"""
-        reasons = []
-        
-        valence = features.get('valence', 0.5)
-        energy = features.get('energy', 0.5)
+        if score <= 0.6:
+            return "Matches your conversation's mood"
         
-        if emotion == 'joy' and valence > 0.6:
-            reasons.append("upbeat and positive vibe")
-        elif emotion == 'sadness' and valence < 0.4:
-            reasons.append("melancholic tone")
-        elif emotion == 'anger' and energy > 0.7:
-            reasons.append("high energy and intensity")
-        
-        if score > 0.8:
-            return f"Perfect match - {', '.join(reasons)}" if reasons else "Perfect emotional match"
-        elif score > 0.6:
-            return f"Great match - {', '.join(reasons)}" if reasons else "Strong emotional match"
+        trigger = REASON_TRIGGERS.get(emotion)
+        if trigger:
+            feature, threshold, above, _ = trigger
+            value = features.get(feature, 0.5)
+            if not (value > threshold if above else value < threshold):
+                emotion = None
         else:
-            return "Matches your conversation's mood"
\ No newline at end of file
+            emotion = None
+        
+        return REASON_MESSAGES[(score > 0.8, emotion)]
\ No newline at end of file
@@ -9,18 +9,15 @@ import os
 # Add parent directory to path for imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-# Load custom CSS
-def load_css():
-    css_file = "styles/custom.css"
-    if os.path.exists(css_file):
-        with open(css_file) as f:
-            st.markdown(f'<style>{f.read()}</style>', unsafe_allow_html=True)
+# Load custom CSS (cached for the process lifetime)
+from utils.styles import load_css
 
 load_css()
 
 from utils.file_parser import SMSParser
-from models.chat_analyzer import ChatAnalyzer
+from utils.analyzer import analyze_cached, hash_file_content
 from utils.database import save_chat_session
+from utils.prefetch import prefetch_enabled, start_prefetch
 
 st.set_page_config(page_title="Upload Chat", page_icon="↑", layout="wide")
 
@@ -53,18 +50,23 @@ if uploaded_file is not None:
     # Preview option
     with st.expander("Preview File Content"):
         try:
-            preview_df = pd.read_csv(uploaded_file)
-            st.dataframe(preview_df.head(10), use_container_width=True)
+            # Only the first rows are shown, so don't parse the whole file here
+            preview_df = pd.read_csv(uploaded_file, nrows=10)
+            st.dataframe(preview_df, use_container_width=True)
+            
+            # Counts only need the Type column
+            uploaded_file.seek(0)
+            message_types = pd.read_csv(uploaded_file, usecols=['Type'], dtype='category')['Type']
             
             # Show statistics
             col1, col2, col3 = st.columns(3)
             with col1:
-                st.metric("Total Messages", len(preview_df))
+                st.metric("Total Messages", len(message_types))
             with col2:
-                sent_count = len(preview_df[preview_df['Type'] == 'Sent'])
+                sent_count = int((message_types == 'Sent').sum())
                 st.metric("Sent Messages", sent_count)
             with col3:
-                received_count = len(preview_df[preview_df['Type'] == 'Received'])
+                received_count = int((message_types == 'Received').sum())
                 st.metric("Received Messages", received_count)
             
             # Reset file pointer for analysis
@@ -90,34 +92,31 @@ if uploaded_file is not None:
         else:
             with st.spinner("Analyzing your conversation... This may take a minute."):
                 try:
-                    # Save file temporarily
-                    temp_path = f"data/temp_{uploaded_file.name}"
-                    os.makedirs("data", exist_ok=True)
-                    
-                    with open(temp_path, "wb") as f:
-                        f.write(uploaded_file.getbuffer())
-                    
-                    # Parse SMS file
+                    # Parse SMS file straight from the upload buffer
+                    uploaded_file.seek(0)
                     parser = SMSParser()
-                    parsed_data = parser.parse_file(temp_path)
-                    
-                    messages = parsed_data['messages']
+                    parsed_data = parser.parse_buffer(uploaded_file)
                     
                     # Filter messages based on user selection
-                    if not include_sent:
-                        messages = [m for m in messages if m['type'] != 'sent']
-                    if not include_received:
-                        messages = [m for m in messages if m['type'] != 'received']
+                    if include_sent and include_received:
+                        messages = parsed_data['messages']
+                    else:
+                        excluded = 'received' if include_sent else 'sent'
+                        messages_df = parsed_data['df']
+                        messages = messages_df[messages_df['type'] != excluded].to_dict('records')
                     
                     if len(messages) == 0:
                         st.error("No messages to analyze after filtering!")
                         st.stop()
                     
-                    # Initialize analyzer
-                    analyzer = ChatAnalyzer()
-                    
-                    # Perform analysis
-                    analysis_results = analyzer.analyze(messages)
+                    # Perform analysis (cached per file content and filter settings)
+                    content_hash = hash_file_content(uploaded_file.getbuffer())
+                    analysis_results = analyze_cached(
+                        content_hash,
+                        include_sent,
+                        include_received,
+                        messages
+                    )
                     
                     # Save to database
                     session_id = save_chat_session(
@@ -134,9 +133,16 @@ if uploaded_file is not None:
                     st.session_state.messages = messages
                     st.session_state.parsed_data = parsed_data
                     st.session_state.analysis_results = analysis_results
+                    st.session_state.analysis_key = f"{content_hash}-{int(include_sent)}{int(include_received)}"
+                    st.session_state.sessions_stale = True
                     
-                    # Clean up temp file
-                    os.remove(temp_path)
+                    # Warm recommendations while the user reviews the analysis
+                    if prefetch_enabled() and 'user_music_preferences' in st.session_state:
+                        start_prefetch(
+                            session_id,
+                            analysis_results,
+                            st.session_state.user_music_preferences
+                        )
                     
                     # Success message
                     st.success("Analysis complete!")
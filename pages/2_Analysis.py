@@ -2,26 +2,276 @@
 Analysis Results Page - Spotify Dark Theme
 """
 import streamlit as st
+import html
+import numpy as np
 import pandas as pd
-import plotly.express as px
 import plotly.graph_objects as go
+import plotly.io as pio
 from datetime import datetime
+from types import MappingProxyType
 import sys
 import os
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-# Load custom CSS
-def load_css():
-    css_file = "styles/custom.css"
-    if os.path.exists(css_file):
-        with open(css_file) as f:
-            st.markdown(f'<style>{f.read()}</style>', unsafe_allow_html=True)
+# Load custom CSS (cached for the process lifetime)
+from utils.styles import load_css
 
 load_css()
 
+from models.chat_analyzer import DAY_NAMES, get_sentiment_analyzer
+from utils.analyzer import hash_file_content
 from utils.database import get_session
 
+# Serialize figures for the browser with orjson, which encodes NumPy arrays natively
+pio.json.config.default_engine = 'orjson'
+
+# The sentiment timeline averages messages into windows so the chart holds
+# fewer than 2x this many points however long the chat is
+TIMELINE_WINDOWS = 50
+
+# Shared Spotify dark-theme styling for every chart on the page
+SPOTIFY_DARK_LAYOUT = MappingProxyType({
+    'template': "plotly_dark",
+    'paper_bgcolor': '#181818',
+    'plot_bgcolor': '#181818',
+    'font': {'color': 'white'}
+})
+SPOTIFY_BAR_STYLE = MappingProxyType({
+    'marker_color': '#1DB954',
+    'marker_line_color': '#1ed760',
+    'marker_line_width': 1
+})
+EMOTION_COLORS = ('#1DB954', '#1ed760', '#2ebd59', '#3fce5e', '#50df63', '#61f068')
+
+def get_message_polarities(analysis_key, analysis, messages):
+    """
+    Per-message sentiment polarity, kept in session state so coming back to
+    this page never re-scores the chat
+    """
+    cache = st.session_state.setdefault('sentiment_cache', {})
+    
+    if cache.get('key') != analysis_key:
+        timeline = analysis['sentiment'].get('timeline', [])
+        
+        if len(timeline) == len(messages):
+            # The analyzer already scored every message
+            polarities = np.fromiter(
+                (point['polarity'] for point in timeline),
+                dtype=np.float64,
+                count=len(timeline)
+            )
+        else:
+            # Score with the analyzer's shared PatternAnalyzer instead of
+            # wrapping each message in a TextBlob
+            sentiment_analyzer = get_sentiment_analyzer()
+            polarities = np.fromiter(
+                (sentiment_analyzer.analyze(msg['content']).polarity for msg in messages),
+                dtype=np.float64,
+                count=len(messages)
+            )
+        
+        cache['key'] = analysis_key
+        cache['polarities'] = polarities
+    
+    return cache['polarities']
+
+@st.cache_data(show_spinner=False)
+def compute_sentiment_timeline(analysis_key, _messages, _polarities):
+    """
+    Windowed sentiment timeline, computed once per analyzed chat
+    
+    Args:
+        analysis_key: Identifies the analyzed messages
+        _messages: Analyzed messages (not hashed - identified by analysis_key)
+        _polarities: Polarity of each message (not hashed)
+        
+    Returns:
+        DataFrame: Window start timestamp, mean sentiment and message count
+    """
+    # Average fixed-size windows with a single vectorized reduction
+    window_size = max(len(_messages) // TIMELINE_WINDOWS, 1)
+    starts = np.arange(0, len(_messages), window_size)
+    window_lengths = np.diff(np.append(starts, len(_messages)))
+    
+    return pd.DataFrame({
+        'timestamp': [_messages[i]['timestamp'] for i in starts],
+        'sentiment': np.add.reduceat(_polarities, starts) / window_lengths if len(starts) else [],
+        'message_count': window_lengths
+    })
+
+def html_table(columns, rows):
+    """Plain HTML table for the small breakdown lists (no pandas round-trip)"""
+    header = ''.join(f"<th>{html.escape(str(column))}</th>" for column in columns)
+    body = '\n'.join(
+        '<tr>' + ''.join(f"<td>{html.escape(str(cell))}</td>" for cell in row) + '</tr>'
+        for row in rows
+    )
+    return f"<table class='data-table'>\n<thead><tr>{header}</tr></thead>\n<tbody>\n{body}\n</tbody>\n</table>"
+
+@st.cache_data(show_spinner=False)
+def build_emotions_table(sorted_percentages, count_items):
+    """Emotion breakdown table from the analyzer's pre-sorted percentages"""
+    counts = dict(count_items)
+    return html_table(
+        ('Emotion', 'Percentage', 'Count'),
+        [
+            (emotion.title(), f"{percentage:.1f}%", counts.get(emotion, 0))
+            for emotion, percentage in sorted_percentages
+        ]
+    )
+
+def build_analysis_figures(analysis, timeline_df):
+    """
+    Build every chart on the page in one go (kept per session in
+    st.session_state.analysis_render, so once per analyzed chat)
+    
+    Args:
+        analysis: Analysis results
+        timeline_df: Sentiment timeline, or None when messages aren't available
+        
+    Returns:
+        dict: Figures by chart name (None for charts without data)
+    """
+    figures = dict.fromkeys(('emotions', 'timeline', 'words', 'hourly', 'daily'))
+    
+    # Emotion distribution pie chart - UPDATED FOR SPOTIFY THEME
+    emotions_data = analysis['emotions']['percentages']
+    
+    fig_emotions = go.Figure(data=[go.Pie(
+        labels=[e.title() for e in emotions_data.keys()],
+        values=list(emotions_data.values()),
+        hole=0.4,
+        marker=dict(
+            colors=EMOTION_COLORS
+        ),
+        textinfo='label+percent',
+        textfont=dict(size=14, color='white')
+    )])
+    
+    fig_emotions.update_layout(
+        title="Emotion Distribution",
+        height=400,
+        showlegend=True,
+        **SPOTIFY_DARK_LAYOUT
+    )
+    figures['emotions'] = fig_emotions
+    
+    if timeline_df is not None:
+        # Plot sentiment over time - UPDATED FOR SPOTIFY THEME
+        # (WebGL trace so long timelines don't bog down SVG rendering)
+        fig_timeline = go.Figure()
+        
+        fig_timeline.add_trace(go.Scattergl(
+            x=timeline_df['timestamp'],
+            y=timeline_df['sentiment'],
+            mode='lines+markers',
+            name='Sentiment',
+            line=dict(color='#1DB954', width=3),
+            marker=dict(size=6, color='#1ed760'),
+            fill='tozeroy',
+            fillcolor='rgba(29, 185, 84, 0.2)'
+        ))
+        
+        # Add zero line
+        fig_timeline.add_hline(
+            y=0,
+            line_dash="dash",
+            line_color="#535353",
+            annotation_text="Neutral",
+            annotation_font_color="#B3B3B3"
+        )
+        
+        fig_timeline.update_layout(
+            title="Sentiment Trend Throughout Conversation",
+            xaxis_title="Time",
+            yaxis_title="Sentiment Score",
+            yaxis_range=[-1, 1],
+            height=400,
+            hovermode='x',
+            **SPOTIFY_DARK_LAYOUT
+        )
+        figures['timeline'] = fig_timeline
+    
+    # Top words bar chart - UPDATED FOR SPOTIFY THEME
+    top_words = analysis['topics']['top_words']
+    words = np.array([word for word, _ in top_words])
+    frequencies = np.array([frequency for _, frequency in top_words])
+    
+    fig_words = go.Figure(go.Bar(
+        x=frequencies,
+        y=words,
+        orientation='h',
+        marker=dict(
+            color=frequencies,
+            colorscale=[[0, '#121212'], [0.5, '#1DB954'], [1, '#1ed760']],
+            showscale=True,
+            colorbar=dict(title='Frequency')
+        )
+    ))
+    
+    fig_words.update_layout(
+        title='Most Frequent Words',
+        xaxis_title='Frequency',
+        yaxis_title='Word',
+        height=400,
+        showlegend=False,
+        yaxis={'categoryorder': 'total ascending'},
+        **SPOTIFY_DARK_LAYOUT
+    )
+    figures['words'] = fig_words
+    
+    temporal = analysis.get('temporal_patterns', {})
+    
+    # Hourly distribution - UPDATED FOR SPOTIFY THEME
+    hourly_counts = temporal.get('hourly_counts')
+    
+    if hourly_counts:
+        fig_hourly = go.Figure()
+        
+        fig_hourly.add_trace(go.Bar(
+            x=np.arange(24),
+            y=np.asarray(hourly_counts),
+            **SPOTIFY_BAR_STYLE,
+            name='Messages'
+        ))
+        
+        fig_hourly.update_layout(
+            title='Messages by Hour of Day',
+            xaxis_title='Hour',
+            yaxis_title='Message Count',
+            height=350,
+            xaxis=dict(tickmode='linear', tick0=0, dtick=2),
+            hovermode=False,
+            **SPOTIFY_DARK_LAYOUT
+        )
+        figures['hourly'] = fig_hourly
+    
+    # Daily distribution - UPDATED FOR SPOTIFY THEME
+    daily_counts = temporal.get('daily_counts')
+    
+    if daily_counts:
+        fig_daily = go.Figure()
+        
+        fig_daily.add_trace(go.Bar(
+            x=DAY_NAMES,
+            y=np.asarray(daily_counts),
+            **SPOTIFY_BAR_STYLE,
+            name='Messages'
+        ))
+        
+        fig_daily.update_layout(
+            title='Messages by Day of Week',
+            xaxis_title='Day',
+            yaxis_title='Message Count',
+            height=350,
+            hovermode=False,
+            **SPOTIFY_DARK_LAYOUT
+        )
+        figures['daily'] = fig_daily
+    
+    return figures
+
 st.set_page_config(page_title="Analysis Results", page_icon="○", layout="wide")
 
 st.title("Chat Analysis Results")
@@ -40,6 +290,27 @@ else:
     st.error("Analysis data not found in session. Please re-upload your chat.")
     st.stop()
 
+messages = st.session_state.get('messages')
+
+# Sessions from before analysis keys existed fall back to hashing the results
+analysis_key = st.session_state.get('analysis_key') or hash_file_content(repr(analysis).encode())
+
+# Derive the timeline and every chart once per analyzed chat. Reruns for the
+# same chat (e.g. button clicks) reuse them without touching the caches.
+if st.session_state.get('analysis_render_key') != analysis_key:
+    if messages is not None:
+        polarities = get_message_polarities(analysis_key, analysis, messages)
+        timeline_df = compute_sentiment_timeline(analysis_key, messages, polarities)
+    else:
+        timeline_df = None
+    st.session_state.analysis_render = (
+        timeline_df,
+        build_analysis_figures(analysis, timeline_df)
+    )
+    st.session_state.analysis_render_key = analysis_key
+
+timeline_df, figures = st.session_state.analysis_render
+
 # Summary section
 st.header("Conversation Summary")
 
@@ -90,53 +361,18 @@ st.header("Emotional Breakdown")
 col1, col2 = st.columns([2, 1])
 
 with col1:
-    # Emotion distribution pie chart - UPDATED FOR SPOTIFY THEME
-    emotions_data = analysis['emotions']['percentages']
-    
-    fig_emotions = go.Figure(data=[go.Pie(
-        labels=[e.title() for e in emotions_data.keys()],
-        values=list(emotions_data.values()),
-        hole=0.4,
-        marker=dict(
-            colors=['#1DB954', '#1ed760', '#2ebd59', '#3fce5e', '#50df63', '#61f068']
-        ),
-        textinfo='label+percent',
-        textfont=dict(size=14, color='white')
-    )])
-    
-    fig_emotions.update_layout(
-        title="Emotion Distribution",
-        height=400,
-        showlegend=True,
-        template="plotly_dark",
-        paper_bgcolor='#181818',
-        plot_bgcolor='#181818',
-        font=dict(color='white')
-    )
-    
-    st.plotly_chart(fig_emotions, use_container_width=True)
+    st.plotly_chart(figures['emotions'], use_container_width=True)
 
 with col2:
     st.subheader("Emotion Breakdown")
     
     # Create a more detailed breakdown
-    emotions_df = pd.DataFrame([
-        {
-            'Emotion': emotion.title(),
-            'Percentage': f"{percentage:.1f}%",
-            'Count': analysis['emotions']['counts'].get(emotion, 0)
-        }
-        for emotion, percentage in sorted(
-            emotions_data.items(),
-            key=lambda x: x[1],
-            reverse=True
-        )
-    ])
-    
-    st.dataframe(
-        emotions_df,
-        use_container_width=True,
-        hide_index=True
+    st.markdown(
+        build_emotions_table(
+            tuple(map(tuple, analysis['emotions']['sorted_percentages'])),
+            tuple(analysis['emotions']['counts'].items())
+        ),
+        unsafe_allow_html=True
     )
 
 st.divider()
@@ -144,78 +380,19 @@ st.divider()
 # Sentiment Timeline
 st.header("Sentiment Over Time")
 
-if 'messages' in st.session_state:
-    messages = st.session_state.messages
-    
-    # Create sentiment timeline
-    sentiment_timeline = []
-    window_size = max(len(messages) // 50, 1)
-    
-    for i in range(0, len(messages), window_size):
-        window = messages[i:i+window_size]
-        if window:
-            from textblob import TextBlob
-            avg_sentiment = sum(
-                TextBlob(msg['content']).sentiment.polarity
-                for msg in window
-            ) / len(window)
-            
-            sentiment_timeline.append({
-                'timestamp': window[0]['timestamp'],
-                'sentiment': avg_sentiment,
-                'message_count': len(window)
-            })
-    
-    # Create dataframe
-    timeline_df = pd.DataFrame(sentiment_timeline)
-    
-    # Plot sentiment over time - UPDATED FOR SPOTIFY THEME
-    fig_timeline = go.Figure()
-    
-    fig_timeline.add_trace(go.Scatter(
-        x=timeline_df['timestamp'],
-        y=timeline_df['sentiment'],
-        mode='lines+markers',
-        name='Sentiment',
-        line=dict(color='#1DB954', width=3),
-        marker=dict(size=6, color='#1ed760'),
-        fill='tozeroy',
-        fillcolor='rgba(29, 185, 84, 0.2)'
-    ))
-    
-    # Add zero line
-    fig_timeline.add_hline(
-        y=0,
-        line_dash="dash",
-        line_color="#535353",
-        annotation_text="Neutral",
-        annotation_font_color="#B3B3B3"
-    )
-    
-    fig_timeline.update_layout(
-        title="Sentiment Trend Throughout Conversation",
-        xaxis_title="Time",
-        yaxis_title="Sentiment Score",
-        yaxis_range=[-1, 1],
-        height=400,
-        hovermode='x unified',
-        template="plotly_dark",
-        paper_bgcolor='#181818',
-        plot_bgcolor='#181818',
-        font=dict(color='white')
-    )
-    
-    st.plotly_chart(fig_timeline, use_container_width=True)
+if timeline_df is not None:
+    st.plotly_chart(figures['timeline'], use_container_width=True)
     
     # Sentiment statistics
+    window_sentiments = timeline_df['sentiment'].to_numpy()
     col1, col2, col3 = st.columns(3)
     
     with col1:
-        positive_msgs = sum(1 for s in timeline_df['sentiment'] if s > 0.1)
+        positive_msgs = int((window_sentiments > 0.1).sum())
         st.metric("Positive Periods", f"{positive_msgs}/{len(timeline_df)}")
     
     with col2:
-        negative_msgs = sum(1 for s in timeline_df['sentiment'] if s < -0.1)
+        negative_msgs = int((window_sentiments < -0.1).sum())
         st.metric("Negative Periods", f"{negative_msgs}/{len(timeline_df)}")
     
     with col3:
@@ -232,46 +409,15 @@ topics = analysis['topics']
 col1, col2 = st.columns([2, 1])
 
 with col1:
-    # Top words bar chart - UPDATED FOR SPOTIFY THEME
-    top_words_df = pd.DataFrame(
-        topics['top_words'],
-        columns=['Word', 'Frequency']
-    )
-    
-    fig_words = px.bar(
-        top_words_df,
-        x='Frequency',
-        y='Word',
-        orientation='h',
-        title='Most Frequent Words',
-        color='Frequency',
-        color_continuous_scale=['#121212', '#1DB954', '#1ed760']
-    )
-    
-    fig_words.update_layout(
-        height=400,
-        showlegend=False,
-        yaxis={'categoryorder': 'total ascending'},
-        template="plotly_dark",
-        paper_bgcolor='#181818',
-        plot_bgcolor='#181818',
-        font=dict(color='white')
-    )
-    
-    st.plotly_chart(fig_words, use_container_width=True)
+    st.plotly_chart(figures['words'], use_container_width=True)
 
 with col2:
     st.subheader("Top Phrases")
     
     if topics['top_phrases']:
-        phrases_df = pd.DataFrame(
-            topics['top_phrases'],
-            columns=['Phrase', 'Count']
-        )
-        st.dataframe(
-            phrases_df,
-            use_container_width=True,
-            hide_index=True
+        st.markdown(
+            html_table(('Phrase', 'Count'), topics['top_phrases']),
+            unsafe_allow_html=True
         )
     else:
         st.info("No significant phrases detected")
@@ -293,73 +439,14 @@ if temporal:
     col1, col2 = st.columns(2)
     
     with col1:
-        # Hourly distribution - UPDATED FOR SPOTIFY THEME
-        hourly = temporal.get('hourly_distribution', {})
-        
-        if hourly:
-            hours = list(range(24))
-            counts = [hourly.get(h, 0) for h in hours]
-            
-            fig_hourly = go.Figure()
-            
-            fig_hourly.add_trace(go.Bar(
-                x=hours,
-                y=counts,
-                marker_color='#1DB954',
-                marker_line_color='#1ed760',
-                marker_line_width=1,
-                name='Messages'
-            ))
-            
-            fig_hourly.update_layout(
-                title='Messages by Hour of Day',
-                xaxis_title='Hour',
-                yaxis_title='Message Count',
-                height=350,
-                xaxis=dict(tickmode='linear', tick0=0, dtick=2),
-                template="plotly_dark",
-                paper_bgcolor='#181818',
-                plot_bgcolor='#181818',
-                font=dict(color='white')
-            )
-            
-            st.plotly_chart(fig_hourly, use_container_width=True)
+        if figures['hourly'] is not None:
+            st.plotly_chart(figures['hourly'], use_container_width=True)
             
             st.info(f"Peak messaging hour: {temporal.get('peak_hour', 'N/A')}:00")
     
     with col2:
-        # Daily distribution - UPDATED FOR SPOTIFY THEME
-        daily = temporal.get('daily_distribution', {})
-        
-        if daily:
-            days_order = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 
-                         'Friday', 'Saturday', 'Sunday']
-            days = [d for d in days_order if d in daily]
-            counts = [daily[d] for d in days]
-            
-            fig_daily = go.Figure()
-            
-            fig_daily.add_trace(go.Bar(
-                x=days,
-                y=counts,
-                marker_color='#1DB954',
-                marker_line_color='#1ed760',
-                marker_line_width=1,
-                name='Messages'
-            ))
-            
-            fig_daily.update_layout(
-                title='Messages by Day of Week',
-                xaxis_title='Day',
-                yaxis_title='Message Count',
-                height=350,
-                template="plotly_dark",
-                paper_bgcolor='#181818',
-                plot_bgcolor='#181818',
-                font=dict(color='white')
-            )
-            
-            st.plotly_chart(fig_daily, use_container_width=True)
+        if figures['daily'] is not None:
+            st.plotly_chart(figures['daily'], use_container_width=True)
             
             st.info(f"Most active day: {temporal.get('most_active_day', 'N/A')}")
 
@@ -2,24 +2,144 @@
 Music Recommendations Page - Spotify Dark Theme
 """
 import streamlit as st
+import numpy as np
+import html
 import sys
 import os
+from collections import Counter
+from types import MappingProxyType
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-# Load custom CSS
-def load_css():
-    css_file = "styles/custom.css"
-    if os.path.exists(css_file):
-        with open(css_file) as f:
-            st.markdown(f'<style>{f.read()}</style>', unsafe_allow_html=True)
+# Load custom CSS (cached for the process lifetime)
+from utils.styles import load_css
 
 load_css()
 
-from utils.music_preferences import MusicPreferenceCapture, render_preference_summary
+from utils.music_preferences import get_preference_capture, render_preference_summary
 from models.music_recommender import MusicRecommender
-from services.spotify_client import SpotifyClient
+from services.spotify_client import get_client
 from utils.database import save_recommendations
+from utils.prefetch import DEFAULT_TRACK_COUNT, take_prefetched
+
+# Playlist track card, filled per track and written in one batch
+# (kept flush-left so the joined HTML isn't read as a Markdown code block)
+TRACK_CARD_HTML = """<div class='spotify-card' style='margin-bottom: 32px;'>
+<div style='display: flex; align-items: center; gap: 16px;'>
+<span class='track-number' style='color: #B3B3B3; font-size: 1rem; font-weight: 400; min-width: 24px;'>{idx}</span>
+<div style='width: 48px; height: 48px; background: linear-gradient(135deg, #1DB954 0%, #1ed760 100%); border-radius: 4px; box-shadow: 0 4px 8px rgba(0,0,0,0.3);'></div>
+<div style='flex: 1;'>
+<div style='color: #FFFFFF; font-size: 1rem; font-weight: 600; margin-bottom: 4px;'>{name}</div>
+<div style='color: #B3B3B3; font-size: 0.875rem;'>{artist}</div>
+</div>
+<div style='text-align: right; min-width: 100px;'>
+<div style='color: #1DB954; font-weight: 700; font-size: 1.125rem;'>{score:.0%}</div>
+<div style='color: #B3B3B3; font-size: 0.75rem;'>Match</div>
+</div>
+</div>
+<div style='margin-top: 12px; padding-top: 12px; border-top: 1px solid #282828;'>
+<div style='display: flex; justify-content: space-between; align-items: center;'>
+<div style='color: #B3B3B3; font-size: 0.813rem;'>◉ {reason}</div>
+<div style='color: #535353; font-size: 0.75rem;'>{album}</div>
+</div>
+</div>{play_link}{features}
+</div>"""
+
+TRACK_PLAY_HTML = "\n<a class='track-play' href='{url}' target='_blank'>▶ Play on Spotify</a>"
+
+TRACK_FEATURES_HTML = """
+<details class='track-features'>
+<summary>Audio Features</summary>
+<div class='track-features-grid'>
+<div>Energy<strong>{energy:.2f}</strong></div>
+<div>Valence<strong>{valence:.2f}</strong></div>
+<div>Danceability<strong>{danceability:.2f}</strong></div>
+<div>Tempo<strong>{tempo:.0f} BPM</strong></div>
+</div>
+</details>"""
+
+def render_track_card(idx, track):
+    """Fill the track card template for one recommended track"""
+    features = track.get('audio_features')
+    return TRACK_CARD_HTML.format(
+        idx=idx,
+        name=html.escape(track['name']),
+        artist=html.escape(track['artist']),
+        score=track.get('relevance_score', 0.5),
+        reason=html.escape(track.get('reason', 'Matches your preferences')),
+        album=html.escape(track['album']),
+        play_link=TRACK_PLAY_HTML.format(url=html.escape(track['spotify_url'])) if track['spotify_url'] else '',
+        features=TRACK_FEATURES_HTML.format(
+            energy=features.get('energy', 0),
+            valence=features.get('valence', 0),
+            danceability=features.get('danceability', 0),
+            tempo=features.get('tempo', 0)
+        ) if features else ''
+    )
+
+# Preference method -> check returning (is_valid, warning shown when invalid)
+PREFERENCE_VALIDATORS = MappingProxyType({
+    'genre_selection': lambda p: (
+        bool(p.get('genres')),
+        "Please select at least one genre in the preferences tab"
+    ),
+    'spotify_profile': lambda p: (
+        bool(p.get('authenticated', False)),
+        "Please authenticate with Spotify in the preferences tab"
+    ),
+    'seed_input': lambda p: (
+        bool(p.get('artists') or p.get('tracks')),
+        "Please provide at least one artist or song in the preferences tab"
+    )
+})
+
+def strategy_inputs(prefs):
+    """The parts of the preferences that the Get Recommendations tab displays or validates"""
+    return (
+        prefs.get('method'),
+        tuple(prefs.get('genres') or ()),
+        tuple(prefs.get('artists') or ()),
+        tuple(prefs.get('tracks') or ()),
+        prefs.get('authenticated')
+    )
+
+@st.fragment
+def preference_section():
+    """
+    Preference widgets, summary and saved state as one fragment, so tweaking
+    a widget reruns only this section. The whole page reruns only when
+    something the Get Recommendations tab shows has changed.
+    """
+    # Render preference UI
+    user_preferences = pref_capture.render_preference_ui()
+    
+    # Store in session state
+    previous = st.session_state.get('user_music_preferences')
+    st.session_state.user_music_preferences = user_preferences
+    
+    # Show summary
+    if user_preferences.get('genres') or user_preferences.get('artists') or user_preferences.get('authenticated'):
+        st.divider()
+        render_preference_summary(user_preferences)
+        
+        st.success("Preferences saved! Go to the 'Get Recommendations' tab.")
+    
+    if previous is not None and strategy_inputs(previous) != strategy_inputs(user_preferences):
+        st.rerun()
+
+def summarize_recommendations(recommendations):
+    """Playlist-level aggregates, computed once per generated playlist"""
+    count = len(recommendations)
+    scores = np.fromiter((r.get('relevance_score', 0.5) for r in recommendations), dtype=np.float64, count=count)
+    popularities = np.fromiter((r['popularity'] for r in recommendations), dtype=np.int64, count=count)
+    durations = np.fromiter((r['duration_ms'] for r in recommendations), dtype=np.int64, count=count)
+    return {
+        'track_count': count,
+        'avg_score': float(scores.mean()),
+        'avg_popularity': float(popularities.mean()),
+        'total_duration_min': int(durations.sum()) / 1000 / 60,
+        'genres': Counter(r.get('genre_source', 'Unknown') for r in recommendations).most_common()
+    }
 
 st.set_page_config(page_title="Music Recommendations", page_icon="♪", layout="wide")
 
@@ -31,8 +151,8 @@ if not st.session_state.get('analysis_complete', False):
     st.info("Use the sidebar to navigate to the Upload page")
     st.stop()
 
-# Initialize preference capture
-pref_capture = MusicPreferenceCapture()
+# Shared preference capture (session state initialized per session)
+pref_capture = get_preference_capture()
 
 # Create tabs for the recommendation process
 tab1, tab2, tab3 = st.tabs(["Set Preferences", "Get Recommendations", "Your Playlist"])
@@ -63,18 +183,7 @@ with tab1:
     
     st.divider()
     
-    # Render preference UI
-    user_preferences = pref_capture.render_preference_ui()
-    
-    # Store in session state
-    st.session_state.user_music_preferences = user_preferences
-    
-    # Show summary
-    if user_preferences.get('genres') or user_preferences.get('artists') or user_preferences.get('authenticated'):
-        st.divider()
-        render_preference_summary(user_preferences)
-        
-        st.success("Preferences saved! Go to the 'Get Recommendations' tab.")
+    preference_section()
 
 # TAB 2: Generate Recommendations
 with tab2:
@@ -88,22 +197,14 @@ with tab2:
     user_prefs = st.session_state.user_music_preferences
     
     # Validate preferences based on method
-    prefs_valid = False
-    
-    if user_prefs['method'] == 'genre_selection':
-        prefs_valid = len(user_prefs.get('genres', [])) > 0
-        if not prefs_valid:
-            st.warning("Please select at least one genre in the preferences tab")
-    elif user_prefs['method'] == 'spotify_profile':
-        prefs_valid = user_prefs.get('authenticated', False)
-        if not prefs_valid:
-            st.warning("Please authenticate with Spotify in the preferences tab")
-    elif user_prefs['method'] == 'seed_input':
-        prefs_valid = len(user_prefs.get('artists', [])) > 0 or len(user_prefs.get('tracks', [])) > 0
-        if not prefs_valid:
-            st.warning("Please provide at least one artist or song in the preferences tab")
+    validator = PREFERENCE_VALIDATORS.get(user_prefs['method'])
     
+    if validator is None:
+        st.stop()
+    
+    prefs_valid, warning = validator(user_prefs)
     if not prefs_valid:
+        st.warning(warning)
         st.stop()
     
     # Show what we'll use
@@ -135,7 +236,7 @@ with tab2:
         "How many songs do you want?",
         min_value=10,
         max_value=50,
-        value=20,
+        value=DEFAULT_TRACK_COUNT,
         step=5
     )
     
@@ -144,22 +245,30 @@ with tab2:
         
         with st.spinner("Finding perfect tracks for you..."):
             try:
-                # Initialize Spotify client
-                spotify = SpotifyClient(use_oauth=True)
-                
-                # Initialize recommender
-                recommender = MusicRecommender(spotify.sp)
-                
-                # Get analysis results
-                analysis = st.session_state.analysis_results
-                
-                # Generate recommendations
-                recommendations = recommender.generate_recommendations(
-                    chat_analysis=analysis,
-                    user_preferences=user_prefs,
-                    limit=num_tracks
+                # Use recommendations prefetched after upload if they match
+                recommendations = take_prefetched(
+                    st.session_state.current_session_id,
+                    user_prefs,
+                    num_tracks
                 )
                 
+                if recommendations is None:
+                    # Shared Spotify client (reused across reruns)
+                    spotify = get_client(use_oauth=True)
+                    
+                    # Initialize recommender
+                    recommender = MusicRecommender(spotify)
+                    
+                    # Get analysis results
+                    analysis = st.session_state.analysis_results
+                    
+                    # Generate recommendations
+                    recommendations = recommender.generate_recommendations(
+                        chat_analysis=analysis,
+                        user_preferences=user_prefs,
+                        limit=num_tracks
+                    )
+                
                 if recommendations:
                     # Save to database
                     save_recommendations(
@@ -168,6 +277,7 @@ with tab2:
                     )
                     
                     st.session_state.recommendations = recommendations
+                    st.session_state.recommendation_summary = summarize_recommendations(recommendations)
                     st.session_state.recommendations_ready = True
                     
                     st.success(f"Generated {len(recommendations)} recommendations!")
@@ -191,74 +301,33 @@ with tab3:
     
     recommendations = st.session_state.recommendations
     
+    # Aggregates are computed when the playlist is generated
+    if 'recommendation_summary' not in st.session_state:
+        st.session_state.recommendation_summary = summarize_recommendations(recommendations)
+    summary = st.session_state.recommendation_summary
+    
     # Playlist summary
     st.subheader("Playlist Overview")
     col1, col2, col3, col4 = st.columns(4)
     
     with col1:
-        st.metric("Total Tracks", len(recommendations))
+        st.metric("Total Tracks", summary['track_count'])
     with col2:
-        avg_score = sum(r.get('relevance_score', 0.5) for r in recommendations) / len(recommendations)
-        st.metric("Avg Match Score", f"{avg_score:.0%}")
+        st.metric("Avg Match Score", f"{summary['avg_score']:.0%}")
     with col3:
-        avg_popularity = sum(r['popularity'] for r in recommendations) / len(recommendations)
-        st.metric("Avg Popularity", f"{avg_popularity:.0f}")
+        st.metric("Avg Popularity", f"{summary['avg_popularity']:.0f}")
     with col4:
-        total_duration = sum(r['duration_ms'] for r in recommendations) / 1000 / 60
-        st.metric("Total Duration", f"{total_duration:.0f} min")
+        st.metric("Total Duration", f"{summary['total_duration_min']:.0f} min")
     
     st.divider()
     
     # Display each track - SPOTIFY CARD STYLE
     st.subheader("Your Tracks")
     
-    for idx, track in enumerate(recommendations, 1):
-        # Spotify-style track card
-        st.markdown(f"""
-        <div class='spotify-card' style='margin-bottom: 16px;'>
-            <div style='display: flex; align-items: center; gap: 16px;'>
-                <span class='track-number' style='color: #B3B3B3; font-size: 1rem; font-weight: 400; min-width: 24px;'>{idx}</span>
-                <div style='width: 48px; height: 48px; background: linear-gradient(135deg, #1DB954 0%, #1ed760 100%); border-radius: 4px; box-shadow: 0 4px 8px rgba(0,0,0,0.3);'></div>
-                <div style='flex: 1;'>
-                    <div style='color: #FFFFFF; font-size: 1rem; font-weight: 600; margin-bottom: 4px;'>{track['name']}</div>
-                    <div style='color: #B3B3B3; font-size: 0.875rem;'>{track['artist']}</div>
-                </div>
-                <div style='text-align: right; min-width: 100px;'>
-                    <div style='color: #1DB954; font-weight: 700; font-size: 1.125rem;'>{track.get('relevance_score', 0.5):.0%}</div>
-                    <div style='color: #B3B3B3; font-size: 0.75rem;'>Match</div>
-                </div>
-            </div>
-            <div style='margin-top: 12px; padding-top: 12px; border-top: 1px solid #282828;'>
-                <div style='display: flex; justify-content: space-between; align-items: center;'>
-                    <div style='color: #B3B3B3; font-size: 0.813rem;'>◉ {track.get('reason', 'Matches your preferences')}</div>
-                    <div style='color: #535353; font-size: 0.75rem;'>{track['album']}</div>
-                </div>
-            </div>
-        </div>
-        """, unsafe_allow_html=True)
-        
-        # Spotify button
-        col1, col2, col3 = st.columns([1, 4, 1])
-        with col1:
-            if track['spotify_url']:
-                st.link_button("▶ Play on Spotify", track['spotify_url'])
-        
-        # Show audio features if available
-        if 'audio_features' in track and track['audio_features']:
-            with st.expander("Audio Features"):
-                features = track['audio_features']
-                
-                feat_col1, feat_col2, feat_col3, feat_col4 = st.columns(4)
-                with feat_col1:
-                    st.metric("Energy", f"{features.get('energy', 0):.2f}")
-                with feat_col2:
-                    st.metric("Valence", f"{features.get('valence', 0):.2f}")
-                with feat_col3:
-                    st.metric("Danceability", f"{features.get('danceability', 0):.2f}")
-                with feat_col4:
-                    st.metric("Tempo", f"{features.get('tempo', 0):.0f} BPM")
-        
-        st.markdown("<br>", unsafe_allow_html=True)
+    st.markdown(
+        "\n".join(render_track_card(idx, track) for idx, track in enumerate(recommendations, 1)),
+        unsafe_allow_html=True
+    )
     
     st.divider()
     
@@ -283,14 +352,11 @@ with tab3:
     
     # Genre distribution (if available)
     if recommendations:
-        genres_count = {}
-        for track in recommendations:
-            genre = track.get('genre_source', 'Unknown')
-            genres_count[genre] = genres_count.get(genre, 0) + 1
+        genres_count = summary['genres']
         
         st.markdown("**Genres in Your Playlist:**")
         genre_cols = st.columns(min(len(genres_count), 4))
-        for idx, (genre, count) in enumerate(genres_count.items()):
+        for idx, (genre, count) in enumerate(genres_count):
             with genre_cols[idx % len(genre_cols)]:
                 st.metric(genre.title(), count)
 
@@ -1,14 +1,111 @@
 """
 Spotify Client - Handles authentication and API interactions
 """
+import requests
 import spotipy
+from spotipy.cache_handler import CacheHandler
+from spotipy.exceptions import SpotifyException
 from spotipy.oauth2 import SpotifyOAuth, SpotifyClientCredentials
+import functools
+import itertools
+import json
 import os
+import random
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from utils.database import get_auth_token, save_auth_token
+from utils.rate_limiter import TokenBucket
 
 # Load environment variables
 load_dotenv()
 
+# Spotify accepts at most this many IDs per audio-features request
+AUDIO_FEATURES_BATCH_SIZE = 100
+
+# Cap on audio-features requests in flight across the whole process, to stay
+# under Spotify's per-second rate limit
+_audio_features_slots = threading.BoundedSemaphore(4)
+
+# Long-lived pool for batch fan-out, so calls don't spin up threads each time
+_batch_executor = ThreadPoolExecutor(max_workers=8)
+
+# Retries for rate-limited (429) and server-error (5xx) responses
+MAX_RETRIES = 5
+
+# Paces every request from this process (all users share one client ID) to
+# stay under Spotify's rolling rate limit; 429 backoff is the fallback
+_rate_limiter = TokenBucket(capacity=90, refill_per_sec=3)
+
+# Genre seeds rarely change, so they are kept on disk for a week
+GENRE_SEEDS_PATH = "data/genre_seeds.json"
+GENRE_SEEDS_TTL = 7 * 24 * 3600
+
+# One client per auth mode for the whole process (see get_client)
+_clients = {}
+_clients_lock = threading.Lock()
+
+# user_auth row holding the token for this single-user app
+DEFAULT_AUTH_USER = 'local'
+
+def _build_session():
+    """HTTP session with a connection pool large enough for concurrent batches"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=10, pool_maxsize=20)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+class DatabaseCacheHandler(CacheHandler):
+    """
+    Keeps the OAuth token in memory and persists it to the user_auth table
+    
+    spotipy's file cache re-reads the token from disk on every API call; this
+    only touches the database on first use and when spotipy saves a new or
+    refreshed token, which it does once the stored one has expired.
+    """
+    
+    def __init__(self, scope, user_id=DEFAULT_AUTH_USER):
+        self.scope = scope
+        self.user_id = user_id
+        self._token_info = None
+    
+    def get_cached_token(self):
+        if self._token_info is None:
+            try:
+                row = get_auth_token(self.user_id)
+            except Exception as e:
+                print(f"Error loading Spotify token: {e}")
+                row = None
+            
+            if row:
+                self._token_info = {
+                    'access_token': row['access_token'],
+                    'refresh_token': row['refresh_token'],
+                    'token_type': 'Bearer',
+                    'expires_at': int(datetime.fromisoformat(row['token_expiry']).timestamp()),
+                    # Only tokens granted for this scope are ever stored
+                    'scope': self.scope
+                }
+        
+        return self._token_info
+    
+    def save_token_to_cache(self, token_info):
+        self._token_info = token_info
+        try:
+            save_auth_token(
+                self.user_id,
+                token_info['access_token'],
+                token_info.get('refresh_token'),
+                datetime.fromtimestamp(token_info['expires_at']).isoformat()
+            )
+        except Exception as e:
+            print(f"Error saving Spotify token: {e}")
+
 class SpotifyClient:
     """Wrapper for Spotify API using spotipy"""
     
@@ -33,6 +130,14 @@ class SpotifyClient:
         self.use_oauth = use_oauth
         self.sp = None
         
+        # Spotify ID of the logged-in user, fetched on first playlist creation
+        self._user_id = None
+        
+        # Per-instance memo of catalog lookups (bound here so `self` isn't part
+        # of the cache key). Failed calls raise and so are never cached.
+        self._cached_search = functools.lru_cache(maxsize=512)(self._search)
+        self._cached_genre_seeds = functools.lru_cache(maxsize=1)(self._fetch_genre_seeds)
+        
         if use_oauth:
             self._init_oauth()
         else:
@@ -63,10 +168,10 @@ class SpotifyClient:
             client_secret=self.client_secret,
             redirect_uri=self.redirect_uri,
             scope=scope,
-            cache_path=".spotify_cache"
+            cache_handler=DatabaseCacheHandler(scope)
         )
         
-        self.sp = spotipy.Spotify(auth_manager=auth_manager)
+        self.sp = spotipy.Spotify(auth_manager=auth_manager, requests_session=_build_session())
     
     def _init_client_credentials(self):
         """Initialize with client credentials (no user data access)"""
@@ -75,7 +180,33 @@ class SpotifyClient:
             client_secret=self.client_secret
         )
         
-        self.sp = spotipy.Spotify(auth_manager=auth_manager)
+        self.sp = spotipy.Spotify(auth_manager=auth_manager, requests_session=_build_session())
+    
+    def call_with_retry(self, fn, *args, max_retries=MAX_RETRIES, **kwargs):
+        """
+        Call a spotipy method, retrying rate-limit and server errors
+        
+        Each attempt first takes a token from the shared rate limiter. 429s
+        wait for the Retry-After header, 5xx responses back off
+        exponentially; both add jitter. Other errors are raised immediately.
+        """
+        for attempt in range(max_retries + 1):
+            _rate_limiter.acquire()
+            try:
+                return fn(*args, **kwargs)
+            except SpotifyException as e:
+                if attempt == max_retries:
+                    raise
+                
+                if e.http_status == 429:
+                    retry_after = int((e.headers or {}).get('Retry-After', 1))
+                    delay = retry_after + random.uniform(0, 0.5 * 2 ** attempt)
+                elif e.http_status >= 500:
+                    delay = min(60, 2 ** attempt) + random.uniform(0, 1)
+                else:
+                    raise
+                
+                time.sleep(delay)
     
     def get_auth_url(self):
         """Get OAuth authorization URL"""
@@ -84,6 +215,34 @@ class SpotifyClient:
         
         return self.sp.auth_manager.get_authorize_url()
     
+    def _search(self, query, kind, limit):
+        """Search the catalog for one item type, returning the items as a tuple"""
+        results = self.call_with_retry(self.sp.search, q=query, type=kind, limit=limit)
+        return tuple(results[f'{kind}s']['items'])
+    
+    def _fetch_genre_seeds(self):
+        """Fetch the available genre seeds as a tuple, via the on-disk cache"""
+        try:
+            if os.stat(GENRE_SEEDS_PATH).st_mtime > time.time() - GENRE_SEEDS_TTL:
+                with open(GENRE_SEEDS_PATH) as f:
+                    return tuple(json.load(f))
+        except (OSError, ValueError):
+            pass  # Missing or unreadable cache - fetch fresh
+        
+        genres = tuple(self.call_with_retry(self.sp.recommendation_genre_seeds)['genres'])
+        
+        # Write to a temp file and swap it in so readers never see a partial file
+        try:
+            cache_dir = os.path.dirname(GENRE_SEEDS_PATH)
+            os.makedirs(cache_dir, exist_ok=True)
+            with tempfile.NamedTemporaryFile('w', dir=cache_dir, suffix='.tmp', delete=False) as f:
+                json.dump(list(genres), f)
+            os.replace(f.name, GENRE_SEEDS_PATH)
+        except OSError as e:
+            print(f"Error caching genre seeds: {e}")
+        
+        return genres
+    
     def search_track(self, query, limit=10):
         """
         Search for tracks
@@ -96,8 +255,7 @@ class SpotifyClient:
             list: Track results
         """
         try:
-            results = self.sp.search(q=query, type='track', limit=limit)
-            return results['tracks']['items']
+            return list(self._cached_search(query, 'track', limit))
         except Exception as e:
             print(f"Error searching tracks: {e}")
             return []
@@ -105,8 +263,7 @@ class SpotifyClient:
     def search_artist(self, query, limit=5):
         """Search for artists"""
         try:
-            results = self.sp.search(q=query, type='artist', limit=limit)
-            return results['artists']['items']
+            return list(self._cached_search(query, 'artist', limit))
         except Exception as e:
             print(f"Error searching artists: {e}")
             return []
@@ -127,7 +284,8 @@ class SpotifyClient:
             dict: Recommendations response
         """
         try:
-            return self.sp.recommendations(
+            return self.call_with_retry(
+                self.sp.recommendations,
                 seed_tracks=seed_tracks,
                 seed_artists=seed_artists,
                 seed_genres=seed_genres,
@@ -148,11 +306,25 @@ class SpotifyClient:
         Returns:
             list: Audio features for each track
         """
-        try:
-            return self.sp.audio_features(track_ids)
-        except Exception as e:
-            print(f"Error getting audio features: {e}")
-            return [None] * len(track_ids)
+        batches = [
+            track_ids[i:i + AUDIO_FEATURES_BATCH_SIZE]
+            for i in range(0, len(track_ids), AUDIO_FEATURES_BATCH_SIZE)
+        ]
+        
+        def fetch_batch(batch):
+            try:
+                with _audio_features_slots:
+                    return self.call_with_retry(self.sp.audio_features, batch)
+            except Exception as e:
+                print(f"Error getting audio features: {e}")
+                return [None] * len(batch)
+        
+        # A single batch (the usual case) needs no fan-out
+        if len(batches) <= 1:
+            return fetch_batch(batches[0]) if batches else []
+        
+        # Fetch batches concurrently; map() keeps them in input order
+        return list(itertools.chain.from_iterable(_batch_executor.map(fetch_batch, batches)))
     
     def create_playlist(self, name, track_ids, description="", public=True):
         """
@@ -168,23 +340,26 @@ class SpotifyClient:
             str: Playlist URL
         """
         try:
-            # Get current user
-            user = self.sp.current_user()
-            user_id = user['id']
+            # Get current user (once per client)
+            if self._user_id is None:
+                self._user_id = self.call_with_retry(self.sp.current_user)['id']
             
             # Create playlist
-            playlist = self.sp.user_playlist_create(
-                user=user_id,
+            playlist = self.call_with_retry(
+                self.sp.user_playlist_create,
+                user=self._user_id,
                 name=name,
                 public=public,
                 description=description
             )
             
-            # Add tracks (max 100 at a time)
+            # Add tracks (max 100 at a time). Batches stay sequential: Spotify
+            # rejects an insert position past the current end of the playlist,
+            # so concurrent positioned adds fail whenever they land out of order
             if track_ids:
                 for i in range(0, len(track_ids), 100):
                     batch = track_ids[i:i+100]
-                    self.sp.playlist_add_items(playlist['id'], batch)
+                    self.call_with_retry(self.sp.playlist_add_items, playlist['id'], batch)
             
             return playlist['external_urls']['spotify']
             
@@ -205,7 +380,8 @@ class SpotifyClient:
             dict: Top tracks response
         """
         try:
-            return self.sp.current_user_top_tracks(
+            return self.call_with_retry(
+                self.sp.current_user_top_tracks,
                 limit=limit,
                 time_range=time_range
             )
@@ -216,7 +392,8 @@ class SpotifyClient:
     def get_user_top_artists(self, limit=20, time_range='medium_term'):
         """Get user's top artists"""
         try:
-            return self.sp.current_user_top_artists(
+            return self.call_with_retry(
+                self.sp.current_user_top_artists,
                 limit=limit,
                 time_range=time_range
             )
@@ -227,12 +404,25 @@ class SpotifyClient:
     def get_available_genre_seeds(self):
         """Get list of available genre seeds"""
         try:
-            return self.sp.recommendation_genre_seeds()['genres']
+            return list(self._cached_genre_seeds())
         except Exception as e:
             print(f"Error getting genres: {e}")
             return []
 
 
+def get_client(use_oauth=True):
+    """
+    Get the shared SpotifyClient for an auth mode, creating it on first use
+    
+    Reusing one client keeps its token and HTTP connections alive across
+    Streamlit reruns instead of re-authenticating and re-handshaking.
+    """
+    with _clients_lock:
+        if use_oauth not in _clients:
+            _clients[use_oauth] = SpotifyClient(use_oauth=use_oauth)
+        return _clients[use_oauth]
+
+
 # Simple test function
 def test_spotify_connection():
     """Test Spotify API connection"""
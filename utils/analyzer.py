@@ -0,0 +1,33 @@
+"""
+Analyzer access for Streamlit pages
+Keeps one ChatAnalyzer alive across reruns and sessions
+"""
+import hashlib
+import streamlit as st
+from models.chat_analyzer import ChatAnalyzer
+
+@st.cache_resource
+def get_chat_analyzer():
+    """Get the shared ChatAnalyzer (stateless between analyze() calls)"""
+    return ChatAnalyzer()
+
+def hash_file_content(data):
+    """Short, stable hash of an uploaded file's bytes"""
+    return hashlib.blake2b(data, digest_size=8).hexdigest()
+
+# Bounded: each entry is a full analysis, including per-message lists
+@st.cache_data(max_entries=16, ttl=3600, show_spinner=False)
+def analyze_cached(content_hash, include_sent, include_received, _messages):
+    """
+    Analyze messages, reusing the result for a file that was already analyzed
+    
+    Args:
+        content_hash: Hash of the uploaded file (from hash_file_content)
+        include_sent: Whether sent messages were kept
+        include_received: Whether received messages were kept
+        _messages: Filtered messages (not hashed - identified by the args above)
+        
+    Returns:
+        dict: Analysis results from ChatAnalyzer.analyze
+    """
+    return get_chat_analyzer().analyze(_messages)
@@ -3,25 +3,70 @@ Database utilities for storing and retrieving chat analysis data
 using basic SQLite database to test app prototype, could use a
 different relational database of your choosing
 """
+import atexit
 import sqlite3
 import json
+import threading
 from datetime import datetime
 import os
+import orjson
+import pandas as pd
 
 DB_PATH = "data/relaylist.db"
 
+# One open connection per thread, reused by every helper
+_LOCAL = threading.local()
+
 def get_connection():
-    """Get database connection"""
+    """Get this thread's database connection, opening it on first use"""
+    conn = getattr(_LOCAL, 'conn', None)
+    if conn is not None:
+        return conn
+    
     os.makedirs("data", exist_ok=True)
-    conn = sqlite3.connect(DB_PATH)
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
     conn.row_factory = sqlite3.Row
+    # Safe with WAL (set in init_database) and avoids an fsync per commit
+    conn.execute("PRAGMA synchronous=NORMAL")
+    # ~20MB page cache and in-memory temp tables for sorts
+    conn.execute("PRAGMA cache_size=-20000")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    _LOCAL.conn = conn
     return conn
 
+def _close_connection():
+    """Close this thread's connection, if one was opened"""
+    conn = getattr(_LOCAL, 'conn', None)
+    if conn is not None:
+        conn.close()
+        _LOCAL.conn = None
+
+atexit.register(_close_connection)
+
+def _ts_default(obj):
+    """orjson fallback: pandas Timestamps as str(), other datetimes as ISO 8601"""
+    if isinstance(obj, pd.Timestamp):
+        return str(obj)
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    raise TypeError
+
+def _dumps(obj):
+    """Serialize analysis data to a JSON string, encoding timestamps and NumPy values"""
+    return orjson.dumps(
+        obj,
+        default=_ts_default,
+        option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+    ).decode()
+
 def init_database():
     """Initialize database with required tables"""
     conn = get_connection()
     cursor = conn.cursor()
     
+    # Write-ahead logging (persists in the database file)
+    cursor.execute("PRAGMA journal_mode=WAL")
+    
     # Chat sessions table
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS chat_sessions (
@@ -81,8 +126,31 @@ def init_database():
         )
     """)
     
+    # Indexes for the session lookups and newest-first listings
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_reco_session
+        ON recommendations(session_id, relevance_score DESC)
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_ar_session
+        ON analysis_results(session_id)
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_cs_upload
+        ON chat_sessions(upload_date DESC)
+    """)
+    
     conn.commit()
-    conn.close()
+
+def _loads(text):
+    """Parse a stored JSON column ({} when empty)"""
+    if not text:
+        return {}
+    try:
+        return orjson.loads(text)
+    except orjson.JSONDecodeError:
+        # Rows written by json.dumps may hold NaN/Infinity, which orjson rejects
+        return json.loads(text)
 
 def save_chat_session(filename, contact_name, contact_phone, stats, analysis):
     """
@@ -98,9 +166,6 @@ def save_chat_session(filename, contact_name, contact_phone, stats, analysis):
     Returns:
         int: Session ID
     """
-    import pandas as pd
-    from datetime import datetime
-    
     conn = get_connection()
     cursor = conn.cursor()
     
@@ -108,23 +173,6 @@ def save_chat_session(filename, contact_name, contact_phone, stats, analysis):
     start_date = str(stats['start_date']) if stats['start_date'] else None
     end_date = str(stats['end_date']) if stats['end_date'] else None
     
-    # Helper function to convert timestamps in nested structures
-    def convert_timestamps(obj):
-        """Recursively convert pandas Timestamps to strings"""
-        if isinstance(obj, pd.Timestamp):
-            return str(obj)
-        elif isinstance(obj, datetime):
-            return obj.isoformat()
-        elif isinstance(obj, dict):
-            return {k: convert_timestamps(v) for k, v in obj.items()}
-        elif isinstance(obj, list):
-            return [convert_timestamps(item) for item in obj]
-        else:
-            return obj
-    
-    # Convert all timestamps in analysis data
-    analysis_clean = convert_timestamps(analysis)
-    
     # Insert chat session
     cursor.execute("""
         INSERT INTO chat_sessions 
@@ -145,22 +193,21 @@ def save_chat_session(filename, contact_name, contact_phone, stats, analysis):
     
     session_id = cursor.lastrowid
     
-    # Insert analysis results with cleaned data
+    # Insert analysis results (timestamps are encoded by _dumps)
     cursor.execute("""
         INSERT INTO analysis_results
         (session_id, emotions, sentiment, topics, temporal_patterns, summary)
         VALUES (?, ?, ?, ?, ?, ?)
     """, (
         session_id,
-        json.dumps(analysis_clean['emotions']),
-        json.dumps(analysis_clean['sentiment']),
-        json.dumps(analysis_clean['topics']),
-        json.dumps(analysis_clean['temporal_patterns']),
-        analysis_clean['summary']
+        _dumps(analysis['emotions']),
+        _dumps(analysis['sentiment']),
+        _dumps(analysis['topics']),
+        _dumps(analysis['temporal_patterns']),
+        analysis['summary']
     ))
     
     conn.commit()
-    conn.close()
     
     return session_id
 
@@ -178,7 +225,6 @@ def get_session(session_id):
     """, (session_id,))
     
     row = cursor.fetchone()
-    conn.close()
     
     if row:
         return {
@@ -192,26 +238,18 @@ def get_session(session_id):
             'start_date': row['start_date'],
             'end_date': row['end_date'],
             'duration_days': row['duration_days'],
-            'emotions': json.loads(row['emotions']) if row['emotions'] else {},
-            'sentiment': json.loads(row['sentiment']) if row['sentiment'] else {},
-            'topics': json.loads(row['topics']) if row['topics'] else {},
-            'temporal_patterns': json.loads(row['temporal_patterns']) if row['temporal_patterns'] else {},
+            'emotions': _loads(row['emotions']),
+            'sentiment': _loads(row['sentiment']),
+            'topics': _loads(row['topics']),
+            'temporal_patterns': _loads(row['temporal_patterns']),
             'summary': row['summary']
         }
     return None
 
 def save_recommendations(session_id, recommendations):
     """Save music recommendations to database"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    for rec in recommendations:
-        cursor.execute("""
-            INSERT INTO recommendations
-            (session_id, track_id, track_name, artist, spotify_url, 
-             relevance_score, audio_features, recommendation_reason)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
+    rows = [
+        (
             session_id,
             rec['id'],
             rec['name'],
@@ -220,10 +258,21 @@ def save_recommendations(session_id, recommendations):
             rec.get('relevance_score', 0),
             json.dumps(rec.get('audio_features', {})),
             rec.get('reason', '')
-        ))
+        )
+        for rec in recommendations
+    ]
+    
+    conn = get_connection()
+    
+    # One prepared statement for every row, committed atomically
+    with conn:
+        conn.executemany("""
+            INSERT INTO recommendations
+            (session_id, track_id, track_name, artist, spotify_url, 
+             relevance_score, audio_features, recommendation_reason)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, rows)
     
-    conn.commit()
-    conn.close()
 
 def get_recommendations(session_id):
     """Get recommendations for a session"""
@@ -237,7 +286,6 @@ def get_recommendations(session_id):
     """, (session_id,))
     
     rows = cursor.fetchall()
-    conn.close()
     
     return [
         {
@@ -246,12 +294,48 @@ def get_recommendations(session_id):
             'artist': row['artist'],
             'spotify_url': row['spotify_url'],
             'relevance_score': row['relevance_score'],
-            'audio_features': json.loads(row['audio_features']) if row['audio_features'] else {},
+            'audio_features': _loads(row['audio_features']),
             'reason': row['recommendation_reason']
         }
         for row in rows
     ]
 
+def get_auth_token(user_id):
+    """
+    Get the stored Spotify token for a user
+    
+    Returns:
+        dict: access_token, refresh_token and token_expiry, or None
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute("""
+        SELECT access_token, refresh_token, token_expiry
+        FROM user_auth
+        WHERE user_id = ?
+    """, (user_id,))
+    
+    row = cursor.fetchone()
+    
+    return dict(row) if row else None
+
+def save_auth_token(user_id, access_token, refresh_token, token_expiry):
+    """Insert or replace the stored Spotify token for a user"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute("""
+        INSERT INTO user_auth (user_id, access_token, refresh_token, token_expiry)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT(user_id) DO UPDATE SET
+            access_token = excluded.access_token,
+            refresh_token = excluded.refresh_token,
+            token_expiry = excluded.token_expiry
+    """, (user_id, access_token, refresh_token, token_expiry))
+    
+    conn.commit()
+
 def get_all_sessions():
     """Get all chat sessions"""
     conn = get_connection()
@@ -264,6 +348,21 @@ def get_all_sessions():
     """)
     
     rows = cursor.fetchall()
-    conn.close()
     
-    return [dict(row) for row in rows]
\ No newline at end of file
+    return [dict(row) for row in rows]
+
+def get_recent_sessions(limit=5):
+    """Get the most recent chat sessions"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute("""
+        SELECT id, filename, contact_name, upload_date, message_count
+        FROM chat_sessions
+        ORDER BY upload_date DESC
+        LIMIT ?
+    """, (limit,))
+    
+    rows = cursor.fetchall()
+    
+    return [dict(row) for row in rows]
@@ -1,6 +1,29 @@
 """
 Emotion Mapper - Maps chat emotions to Spotify audio features and genres
 """
+from types import MappingProxyType
+
+
+def _build_params_table(emotion_features):
+    """
+    Expand {emotion: {feature: (min, max) or value}} once into read-only
+    {emotion: Spotify target_/min_/max_ params} and {emotion: mid valence}
+    """
+    params_table = {}
+    valences = {}
+    for emotion, features in emotion_features.items():
+        params = {}
+        for feature, value in features.items():
+            if isinstance(value, tuple):
+                params[f'target_{feature}'] = sum(value) / 2
+                params[f'min_{feature}'] = value[0]
+                params[f'max_{feature}'] = value[1]
+            else:
+                params[f'target_{feature}'] = value
+        params_table[emotion] = MappingProxyType(params)
+        valences[emotion] = params.get('target_valence')
+    return MappingProxyType(params_table), MappingProxyType(valences)
+
 
 class EmotionMapper:
     """Maps emotional analysis to music parameters"""
@@ -55,6 +78,9 @@ class EmotionMapper:
         }
     }
     
+    # Precomputed Spotify params per emotion (valence is blended per call)
+    _PARAMS, _VALENCES = _build_params_table(EMOTION_AUDIO_FEATURES)
+    
     # Emotion to genre recommendations
     EMOTION_GENRES = {
         'joy': [
@@ -97,33 +123,21 @@ class EmotionMapper:
         """
         emotion = emotion.lower()
         
-        # Get base features for emotion
-        base_features = EmotionMapper.EMOTION_AUDIO_FEATURES.get(
-            emotion,
-            EmotionMapper.EMOTION_AUDIO_FEATURES['neutral']
-        )
+        # Get precomputed params for emotion
+        if emotion not in EmotionMapper._PARAMS:
+            emotion = 'neutral'
+        params = dict(EmotionMapper._PARAMS[emotion])
         
         # Adjust valence based on sentiment
         sentiment_valence = (sentiment_score + 1) / 2
         
         # Blend emotion valence with sentiment valence
-        if 'valence' in base_features:
-            emotion_valence = sum(base_features['valence']) / 2
+        emotion_valence = EmotionMapper._VALENCES[emotion]
+        if emotion_valence is not None:
             adjusted_valence = emotion_valence * 0.7 + sentiment_valence * 0.3
         else:
             adjusted_valence = sentiment_valence
         
-        # Build parameter dict
-        params = {}
-        
-        for feature, value in base_features.items():
-            if isinstance(value, tuple):
-                params[f'target_{feature}'] = sum(value) / 2
-                params[f'min_{feature}'] = value[0]
-                params[f'max_{feature}'] = value[1]
-            else:
-                params[f'target_{feature}'] = value
-        
         # Override valence with adjusted value
         params['target_valence'] = adjusted_valence
         
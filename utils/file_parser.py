@@ -2,13 +2,52 @@
 SMS CSV File Parser
 Parses SMS CSV files with columns: Type, Date, Name / Number, Sender, Content
 """
+import numpy as np
 import pandas as pd
 from datetime import datetime
 import re
 
+try:
+    import pyarrow as pa
+    from pyarrow import csv as pa_csv
+except ImportError:  # Optional: falls back to pandas' chunked C reader
+    pa = None
+
+MESSAGE_COLUMNS = ['timestamp', 'sender', 'content', 'type', 'date', 'time']
+
+# Columns an SMS export must have; anything else in the file is not read
+REQUIRED_COLUMNS = ['Type', 'Date', 'Name / Number', 'Sender', 'Content']
+
+# Exports are read and cleaned a chunk at a time so the raw text columns
+# never sit in memory all at once: bytes per pyarrow block, or rows per
+# pandas chunk without pyarrow
+CSV_BLOCK_SIZE = 8 << 20
+CSV_CHUNK_ROWS = 100_000
+
+class ParsedChat(dict):
+    """
+    Parse result keyed like a dict, with the message frame under 'df'
+    
+    The list-of-dicts 'messages' view is only built from the frame the first
+    time it is indexed (note that .get() and `in` don't trigger it).
+    """
+    
+    def __missing__(self, key):
+        if key != 'messages':
+            raise KeyError(key)
+        messages = self['df'].to_dict('records')
+        self['messages'] = messages
+        return messages
+
 class SMSParser:
     """Parser for SMS CSV exports"""
     
+    # Phone number in parentheses at the end of the contact string
+    PHONE_RE = re.compile(r'\((\+\d+)\)$')
+    
+    # Date formats tried in order before falling back to per-value inference
+    DATE_FMTS = ('%m/%d/%Y %H:%M',)
+    
     def __init__(self):
         self.messages = []
         self.contact_name = None
@@ -22,44 +61,92 @@ class SMSParser:
             file_path: Path to CSV file
             
         Returns:
-            dict: Parsed data with messages, metadata, and statistics
+            ParsedChat: Message frame ('df'), lazy 'messages' list, contact
+            info, and statistics
+        """
+        return self._parse_chunks(self._read_csv(file_path))
+    
+    def parse_buffer(self, file_like):
         """
-        # Read CSV
-        df = pd.read_csv(file_path)
+        Parse SMS CSV data from an in-memory file-like object
         
-        # Validate columns
-        required_cols = ['Type', 'Date', 'Name / Number', 'Sender', 'Content']
-        if not all(col in df.columns for col in required_cols):
-            raise ValueError(f"CSV must contain columns: {required_cols}")
+        Args:
+            file_like: Readable binary or text buffer (e.g. a Streamlit upload)
+            
+        Returns:
+            ParsedChat: Same as parse_file
+        """
+        return self._parse_chunks(self._read_csv(file_like))
+    
+    def _read_csv(self, source):
+        """
+        Yield the required columns as string DataFrames, one chunk at a time
+        
+        Uses pyarrow's streaming multithreaded reader if installed.
+        """
+        if pa is None:
+            # Select columns with a predicate and check them here, so that only
+            # a missing column (not any other parse error) gets this message
+            chunks = pd.read_csv(
+                source, usecols=REQUIRED_COLUMNS.__contains__, dtype=str, chunksize=CSV_CHUNK_ROWS
+            )
+            with chunks:
+                for chunk in chunks:
+                    if len(chunk.columns) < len(REQUIRED_COLUMNS):
+                        raise ValueError(f"CSV must contain columns: {REQUIRED_COLUMNS}")
+                    yield chunk[REQUIRED_COLUMNS]
+            return
+        
+        try:
+            reader = pa_csv.open_csv(
+                source,
+                read_options=pa_csv.ReadOptions(block_size=CSV_BLOCK_SIZE),
+                # Message bodies can contain line breaks inside quotes
+                parse_options=pa_csv.ParseOptions(newlines_in_values=True),
+                convert_options=pa_csv.ConvertOptions(
+                    include_columns=REQUIRED_COLUMNS,
+                    column_types=dict.fromkeys(REQUIRED_COLUMNS, pa.string()),
+                    strings_can_be_null=True
+                )
+            )
+            for batch in reader:
+                yield batch.to_pandas()
+        except KeyError:
+            raise ValueError(f"CSV must contain columns: {REQUIRED_COLUMNS}")
+        except pa.ArrowInvalid as e:
+            raise ValueError(f"Could not parse CSV file: {e}") from e
+    
+    def _parse_chunks(self, chunks):
+        """Extract messages, contact info and statistics from raw CSV chunks"""
+        first = next(chunks, None)
+        if first is None or first.empty:
+            raise ValueError("CSV contains no messages")
         
         # Extract contact information (assuming single conversation)
         # Parse contact name and phone from first entry
-        first_contact = df['Name / Number'].iloc[0]
+        first_contact = first['Name / Number'].iloc[0]
         self.contact_name, self.contact_phone = self._parse_contact_info(first_contact)
         
-        # Process each message
-        messages = []
-        for idx, row in df.iterrows():
-            try:
-                parsed_msg = self._parse_message(row)
-                if parsed_msg:
-                    messages.append(parsed_msg)
-            except Exception as e:
-                print(f"Warning: Could not parse row {idx}: {e}")
-                continue
+        # Clean each chunk as it is read, then sort the survivors by timestamp
+        parsed = [self._parse_messages(first)]
+        parsed.extend(self._parse_messages(chunk) for chunk in chunks)
         
-        # Sort by timestamp
-        messages.sort(key=lambda x: x['timestamp'])
+        messages_df = pd.concat(parsed, ignore_index=True).sort_values(
+            'timestamp', kind='stable', ignore_index=True
+        )
+        messages_df['date'] = messages_df['timestamp'].dt.date
+        messages_df['time'] = messages_df['timestamp'].dt.time
+        messages_df = messages_df[MESSAGE_COLUMNS]
         
         # Generate statistics
-        stats = self._generate_statistics(messages)
+        stats = self._generate_statistics(messages_df)
         
-        return {
-            'messages': messages,
-            'contact_name': self.contact_name,
-            'contact_phone': self.contact_phone,
-            'statistics': stats
-        }
+        return ParsedChat(
+            df=messages_df,
+            contact_name=self.contact_name,
+            contact_phone=self.contact_phone,
+            statistics=stats
+        )
     
     def _parse_contact_info(self, contact_string):
         """
@@ -68,8 +155,7 @@ class SMSParser:
         Example: "Alex (A-Money) 🏀 (+17185551234)" -> ("Alex (A-Money) 🏀", "+17185551234")
         """
         # Match phone number in parentheses at the end
-        phone_pattern = r'\((\+\d+)\)$'
-        phone_match = re.search(phone_pattern, contact_string)
+        phone_match = self.PHONE_RE.search(contact_string)
         
         if phone_match:
             phone = phone_match.group(1)
@@ -80,59 +166,73 @@ class SMSParser:
         # If no phone found, return full string as name
         return contact_string, "Unknown"
     
-    def _parse_message(self, row):
+    def _parse_messages(self, df):
         """
-        Parse a single message row
+        Parse a chunk of message rows with column operations
+        
+        Rows whose date can't be parsed or whose content is empty are dropped.
         
         Returns:
-            dict: Message data with timestamp, sender, content, type
+            DataFrame: timestamp, sender, content and type, in file order
         """
-        # Parse date
-        try:
-            timestamp = pd.to_datetime(row['Date'], format='%m/%d/%Y %H:%M')
-        except:
-            # Try alternative formats
-            timestamp = pd.to_datetime(row['Date'])
+        # Parse dates, retrying rows in other formats (cache=True parses
+        # each distinct date string once)
+        first_fmt, *other_fmts = self.DATE_FMTS
+        timestamps = pd.to_datetime(df['Date'], format=first_fmt, errors='coerce', cache=True)
+        for fmt in (*other_fmts, 'mixed'):
+            unparsed = timestamps.isna() & df['Date'].notna()
+            if not unparsed.any():
+                break
+            timestamps[unparsed] = pd.to_datetime(
+                df.loc[unparsed, 'Date'], format=fmt, errors='coerce', cache=True
+            )
         
-        # Determine sender
-        if row['Type'] == 'Sent':
-            sender = 'You'
-        else:
-            # Use Sender column if available, otherwise use contact name
-            sender = row['Sender'] if row['Sender'] else self.contact_name
+        # Determine sender: Sender column if available, otherwise contact name
+        senders = df['Sender'].where(df['Sender'].notna() & df['Sender'].ne(''), self.contact_name)
+        senders = np.where(df['Type'] == 'Sent', 'You', senders)
         
-        # Clean content
-        content = str(row['Content']).strip()
+        # Clean content (null cells are checked before stringifying, since
+        # astype(str) turns an object-dtype None into the text 'None')
+        has_content = df['Content'].notna()
+        contents = df['Content'].astype(str).str.strip()
         
-        # Skip empty messages
-        if not content or content == 'nan':
-            return None
+        parsed = pd.DataFrame({
+            'timestamp': timestamps,
+            'sender': senders,
+            'content': contents,
+            'type': df['Type'].str.lower()
+        })
         
-        return {
-            'timestamp': timestamp,
-            'sender': sender,
-            'content': content,
-            'type': row['Type'].lower(),
-            'date': timestamp.date(),
-            'time': timestamp.time()
-        }
+        # Skip empty messages and rows missing a date or type
+        keep = (
+            parsed['timestamp'].notna()
+            & parsed['type'].notna()
+            & has_content
+            & parsed['content'].ne('')
+            & parsed['content'].ne('nan')
+        )
+        skipped = int((timestamps.isna() & df['Date'].notna()).sum())
+        if skipped:
+            print(f"Warning: Could not parse the date of {skipped} rows")
+        
+        return parsed[keep]
     
-    def _generate_statistics(self, messages):
-        """Generate conversation statistics"""
-        if not messages:
+    def _generate_statistics(self, messages_df):
+        """Generate conversation statistics from the parsed message frame"""
+        if messages_df.empty:
             return {}
         
-        total = len(messages)
-        sent = sum(1 for m in messages if m['type'] == 'sent')
+        total = len(messages_df)
+        sent = int((messages_df['type'] == 'sent').sum())
         received = total - sent
         
         # Date range
-        start_date = messages[0]['timestamp']
-        end_date = messages[-1]['timestamp']
+        start_date = messages_df['timestamp'].min()
+        end_date = messages_df['timestamp'].max()
         duration_days = (end_date - start_date).days
         
         # Average message length
-        avg_length = sum(len(m['content']) for m in messages) / total
+        avg_length = float(messages_df['content'].str.len().mean())
         
         # Messages per day
         messages_per_day = total / max(duration_days, 1)
@@ -1,8 +1,57 @@
 """
 Music Preference Capture - Multiple methods for understanding user taste
 """
+import copy
+import functools
+from types import MappingProxyType
+import numpy as np
+import pandas as pd
 import streamlit as st
 
+# Chat emotion -> mood used to look up MOOD_GENRES
+_EMOTION_TO_MOOD = MappingProxyType({
+    'joy': 'happy',
+    'sadness': 'sad',
+    'anger': 'angry',
+    'fear': 'focused',
+    'surprise': 'energetic',
+    'neutral': 'chill'
+})
+
+# Chat emotion -> target track energy
+_ENERGY_MAP = MappingProxyType({
+    'joy': 0.7,
+    'sadness': 0.3,
+    'anger': 0.85,
+    'fear': 0.5,
+    'surprise': 0.75,
+    'neutral': 0.5
+})
+
+# Fixed copy for the preference UI
+_GENRE_INTRO_MD = """
+Select your preferred music genres. We'll use these to filter recommendations
+that match both your chat's mood and your musical taste.
+"""
+
+_SPOTIFY_INTRO_MD = """
+Connect your Spotify account to automatically use your actual listening habits.
+This provides the most accurate recommendations based on what you already enjoy!
+"""
+
+_SPOTIFY_ANALYZE_MD = """
+We'll analyze:
+- Your top artists (last 6 months)
+- Your top tracks (last 6 months)  
+- Your saved songs
+- Genres you listen to most
+"""
+
+_SEED_INTRO_MD = """
+Tell us your favorite artists or songs, and we'll find similar music
+that matches your chat's vibe.
+"""
+
 class MusicPreferenceCapture:
     """Handles capturing and storing user music preferences"""
     
@@ -31,30 +80,50 @@ class MusicPreferenceCapture:
         "reggae", "ska", "gospel", "ambient", "chill", "study"
     ]
     
-    MOOD_GENRES = {
+    # Display order and labels for the genre picker, built once at import
+    _SORTED_GENRES = tuple(sorted(GENRES))
+    _GENRE_TITLES = MappingProxyType({genre: genre.title() for genre in _SORTED_GENRES})
+    
+    # Position of each genre in the combined genre weight vector
+    _GENRE_INDEX = MappingProxyType({genre: i for i, genre in enumerate(_SORTED_GENRES)})
+    
+    MOOD_GENRES = MappingProxyType({
         # Map moods to genre recommendations
-        "happy": ["pop", "dance", "funk", "disco", "reggae"],
-        "sad": ["indie", "acoustic", "blues", "r&b", "soul"],
-        "energetic": ["edm", "rock", "hip-hop", "metal", "drum-and-bass"],
-        "chill": ["lo-fi", "ambient", "jazz", "acoustic", "indie"],
-        "romantic": ["r&b", "soul", "indie", "pop", "acoustic"],
-        "angry": ["metal", "punk", "hard-rock", "rap", "dubstep"],
-        "focused": ["classical", "ambient", "lo-fi", "study", "jazz"]
-    }
+        "happy": ("pop", "dance", "funk", "disco", "reggae"),
+        "sad": ("indie", "acoustic", "blues", "r&b", "soul"),
+        "energetic": ("edm", "rock", "hip-hop", "metal", "drum-and-bass"),
+        "chill": ("lo-fi", "ambient", "jazz", "acoustic", "indie"),
+        "romantic": ("r&b", "soul", "indie", "pop", "acoustic"),
+        "angry": ("metal", "punk", "hard-rock", "rap", "dubstep"),
+        "focused": ("classical", "ambient", "lo-fi", "study", "jazz")
+    })
+    
+    # Session state defaults (copied per session so lists aren't shared)
+    _DEFAULTS = MappingProxyType({
+        'user_genres': [],
+        'seed_artists': [],
+        'seed_tracks': [],
+        'preference_method': "Select Genres I Like"
+    })
     
     def __init__(self):
+        # Preference method label -> UI that captures it
+        self._method_handlers = MappingProxyType({
+            "Select Genres I Like": self._genre_selection_ui,
+            "Connect My Spotify Account": self._spotify_profile_ui,
+            "Provide Favorite Artists/Songs": self._seed_input_ui
+        })
+        
         self.initialize_session_state()
     
     def initialize_session_state(self):
-        """Initialize session state for preferences"""
-        if 'user_genres' not in st.session_state:
-            st.session_state.user_genres = []
-        if 'seed_artists' not in st.session_state:
-            st.session_state.seed_artists = []
-        if 'seed_tracks' not in st.session_state:
-            st.session_state.seed_tracks = []
-        if 'preference_method' not in st.session_state:
-            st.session_state.preference_method = "genre_selection"
+        """Initialize session state for preferences (once per session)"""
+        if st.session_state.get('_prefs_init'):
+            return
+        
+        for key, value in self._DEFAULTS.items():
+            st.session_state.setdefault(key, copy.copy(value))
+        st.session_state['_prefs_init'] = True
     
     def render_preference_ui(self):
         """
@@ -63,57 +132,28 @@ class MusicPreferenceCapture:
         """
         st.subheader("Music Preferences")
         
-        # Method selection
+        # Method selection (bound to st.session_state.preference_method)
         method = st.radio(
             "How would you like to set your music preferences?",
-            [
-                "Select Genres I Like",
-                "Connect My Spotify Account",
-                "Provide Favorite Artists/Songs"
-            ],
-            index=0
+            tuple(self._method_handlers),
+            key="preference_method"
         )
         
-        preferences = {}
-        
-        if "Select Genres" in method:
-            preferences = self._genre_selection_ui()
-            
-        elif "Connect My Spotify" in method:
-            preferences = self._spotify_profile_ui()
-            
-        elif "Provide Favorite" in method:
-            preferences = self._seed_input_ui()
-        
-        return preferences
+        return self._method_handlers[method]()
     
     def _genre_selection_ui(self):
         """Method 1: Direct genre selection"""
-        st.markdown("""
-        Select your preferred music genres. We'll use these to filter recommendations
-        that match both your chat's mood and your musical taste.
-        """)
-        
-        # Primary genres (select 1-5)
-        st.write("**Primary Genres** (Select 1-5)")
-        
-        cols = st.columns(3)
-        selected_genres = []
-        
-        sorted_genres = sorted(self.GENRES)
-        
-        for idx, genre in enumerate(sorted_genres):
-            col_idx = idx % 3
-            with cols[col_idx]:
-                if st.checkbox(genre.title(), key=f"genre_{genre}"):
-                    selected_genres.append(genre)
-        
-        # Validation
-        if len(selected_genres) > 5:
-            st.warning("Please select a maximum of 5 genres for best results")
-            selected_genres = selected_genres[:5]
-        
-        st.session_state.user_genres = selected_genres
+        st.markdown(_GENRE_INTRO_MD)
+        
+        # Primary genres (select 1-5) - one widget, bound to
+        # st.session_state.user_genres through its key
+        selected_genres = st.multiselect(
+            "**Primary Genres** (Select 1-5)",
+            options=self._SORTED_GENRES,
+            format_func=self._GENRE_TITLES.__getitem__,
+            max_selections=5,
+            key="user_genres"
+        )
         
         # Additional preferences
         st.divider()
@@ -153,76 +193,73 @@ class MusicPreferenceCapture:
     
     def _spotify_profile_ui(self):
         """Method 2: Use actual Spotify listening history"""
-        st.markdown("""
-        Connect your Spotify account to automatically use your actual listening habits.
-        This provides the most accurate recommendations based on what you already enjoy!
-        """)
+        st.markdown(_SPOTIFY_INTRO_MD)
+        
+        authenticated = st.session_state.get('spotify_authenticated', False)
+        time_range = None
         
-        if not st.session_state.get('spotify_authenticated', False):
+        if not authenticated:
             st.info("You'll need to authenticate with Spotify first")
             
             if st.button("Connect to Spotify", type="primary"):
                 st.info("Spotify authentication will be implemented in the Recommendations page")
                 # This will trigger OAuth flow in the Recommendations page
-        else:
-            st.success("Spotify Connected!")
-            
-            # Show what will be analyzed
-            st.markdown("""
-            We'll analyze:
-            - Your top artists (last 6 months)
-            - Your top tracks (last 6 months)  
-            - Your saved songs
-            - Genres you listen to most
-            """)
             
-            time_range = st.select_slider(
-                "Time range to analyze",
-                options=["Last 4 weeks", "Last 6 months", "All time"],
-                value="Last 6 months"
-            )
+            return {
+                'method': 'spotify_profile',
+                'authenticated': False,
+                'time_range': time_range
+            }
+        
+        st.success("Spotify Connected!")
+        
+        # Show what will be analyzed
+        st.markdown(_SPOTIFY_ANALYZE_MD)
+        
+        time_range = st.select_slider(
+            "Time range to analyze",
+            options=["Last 4 weeks", "Last 6 months", "All time"],
+            value="Last 6 months"
+        )
         
         return {
             'method': 'spotify_profile',
-            'authenticated': st.session_state.get('spotify_authenticated', False),
-            'time_range': time_range if st.session_state.get('spotify_authenticated') else None
+            'authenticated': authenticated,
+            'time_range': time_range
         }
     
     def _seed_input_ui(self):
         """Method 3: Manual artist/track seeds"""
-        st.markdown("""
-        Tell us your favorite artists or songs, and we'll find similar music
-        that matches your chat's vibe.
-        """)
-        
-        # Artist input
-        st.write("**Favorite Artists** (Enter 1-3)")
-        artist_inputs = []
-        for i in range(3):
-            artist = st.text_input(
-                f"Artist {i+1}",
-                key=f"artist_{i}",
-                placeholder="e.g., Taylor Swift, Kendrick Lamar, The Weeknd"
-            )
-            if artist:
-                artist_inputs.append(artist.strip())
-        
-        st.divider()
+        st.markdown(_SEED_INTRO_MD)
+        
+        # Artist and song input as one grid widget (its edits live in the
+        # widget state, so the blank base table stays the same every rerun)
+        st.write("**Favorite Artists and Songs** (Enter 1-3 of either)")
+        edited = st.data_editor(
+            pd.DataFrame({'Artist': [''] * 3, 'Song': [''] * 3}),
+            column_config={
+                'Artist': st.column_config.TextColumn(
+                    help="e.g., Taylor Swift, Kendrick Lamar, The Weeknd"
+                ),
+                'Song': st.column_config.TextColumn(
+                    help="e.g., Song Name - Artist Name"
+                )
+            },
+            num_rows='fixed',
+            hide_index=True,
+            use_container_width=True,
+            key='seed_editor'
+        )
         
-        # Track input
-        st.write("**Favorite Songs** (Enter 1-3)")
-        track_inputs = []
-        for i in range(3):
-            track = st.text_input(
-                f"Song {i+1}",
-                key=f"track_{i}",
-                placeholder="e.g., Song Name - Artist Name"
-            )
-            if track:
-                track_inputs.append(track.strip())
+        artist_inputs = [a.strip() for a in edited['Artist'] if isinstance(a, str) and a.strip()]
+        track_inputs = [t.strip() for t in edited['Song'] if isinstance(t, str) and t.strip()]
         
-        st.session_state.seed_artists = artist_inputs
-        st.session_state.seed_tracks = track_inputs
+        # The editor returns a DataFrame, so there is no key to bind these to;
+        # only write them back when the entries actually changed
+        if st.session_state.seed_artists != artist_inputs:
+            st.session_state.seed_artists = artist_inputs
+        if st.session_state.seed_tracks != track_inputs:
+            st.session_state.seed_tracks = track_inputs
         
         if not artist_inputs and not track_inputs:
             st.warning("Please provide at least one artist or song")
@@ -233,22 +270,18 @@ class MusicPreferenceCapture:
             'tracks': track_inputs
         }
     
-    def get_genre_suggestions_from_emotion(self, dominant_emotion):
+    @staticmethod
+    @functools.lru_cache(maxsize=16)
+    def get_genre_suggestions_from_emotion(dominant_emotion):
         """
         Suggest genres based on chat emotion analysis
         This bridges the gap between NLP results and music preferences
-        """
-        emotion_to_mood = {
-            'joy': 'happy',
-            'sadness': 'sad',
-            'anger': 'angry',
-            'fear': 'focused',
-            'surprise': 'energetic',
-            'neutral': 'chill'
-        }
         
-        mood = emotion_to_mood.get(dominant_emotion, 'chill')
-        return self.MOOD_GENRES.get(mood, ['pop', 'indie'])
+        Returns:
+            tuple: Genre names (cached per emotion)
+        """
+        mood = _EMOTION_TO_MOOD.get(dominant_emotion, 'chill')
+        return MusicPreferenceCapture.MOOD_GENRES.get(mood, ('pop', 'indie'))
     
     def combine_preferences_with_analysis(self, user_prefs, chat_analysis):
         """
@@ -262,74 +295,117 @@ class MusicPreferenceCapture:
             dict: Combined parameters for music recommendation
         """
         # Get emotion from chat
-        dominant_emotion = chat_analysis.get('emotions', {}).get('dominant', 'neutral')
-        sentiment = chat_analysis.get('sentiment', {}).get('average_polarity', 0)
+        try:
+            dominant_emotion = chat_analysis['emotions']['dominant']
+        except (KeyError, TypeError):
+            dominant_emotion = 'neutral'
+        
+        try:
+            sentiment = chat_analysis['sentiment']['average_polarity']
+        except (KeyError, TypeError):
+            sentiment = 0
+        
+        # Everything but the prefs echo comes from the cached, hashable-keyed core
+        combined = _combine_preferences(
+            user_prefs['method'],
+            tuple(user_prefs.get('genres') or ()),
+            dominant_emotion,
+            sentiment
+        )
         
-        # Get suggested genres from emotion
-        emotion_genres = self.get_genre_suggestions_from_emotion(dominant_emotion)
+        return {**combined, 'user_preferences': user_prefs}
+
+
+@st.cache_resource
+def _shared_preference_capture():
+    """One MusicPreferenceCapture for the process (it keeps no per-session state)"""
+    return MusicPreferenceCapture()
+
+def get_preference_capture():
+    """Get the shared MusicPreferenceCapture, with this session's state initialized"""
+    capture = _shared_preference_capture()
+    capture.initialize_session_state()
+    return capture
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def _combine_preferences(method, user_genres, dominant_emotion, sentiment):
+    """
+    Recommendation parameters for a preference method and chat mood
+    
+    Args:
+        method: User's preference method
+        user_genres: Tuple of the user's selected genres
+        dominant_emotion: Dominant emotion from the chat analysis
+        sentiment: Average sentiment polarity from the chat analysis
+        
+    Returns:
+        dict: Combined parameters, without the raw user preferences
+    """
+    # Get suggested genres from emotion
+    emotion_genres = list(MusicPreferenceCapture.get_genre_suggestions_from_emotion(dominant_emotion))
+    
+    # Combine with user preferences
+    if method == 'genre_selection':
+        user_genres = list(user_genres)
         
-        # Combine with user preferences
-        if user_prefs['method'] == 'genre_selection':
-            user_genres = user_prefs['genres']
-            
-            # Find intersection between user preferences and emotion-matched genres
-            combined_genres = list(set(user_genres + emotion_genres))
-            
-            # Prioritize user's selected genres
-            final_genres = user_genres if user_genres else emotion_genres
-            
-        elif user_prefs['method'] == 'spotify_profile':
-            # Will use Spotify's recommendation engine with user's profile
-            final_genres = None  # Handled by Spotify API
-            
-        else:  # seed_input
-            # Use emotion genres as backup
-            final_genres = emotion_genres
-        
-        # Map sentiment to audio features
-        # Sentiment ranges from -1 (negative) to 1 (positive)
-        valence_target = (sentiment + 1) / 2  # Convert to 0-1 range
-        
-        # Adjust energy based on emotion
-        energy_map = {
-            'joy': 0.7,
-            'sadness': 0.3,
-            'anger': 0.85,
-            'fear': 0.5,
-            'surprise': 0.75,
-            'neutral': 0.5
-        }
-        energy_target = energy_map.get(dominant_emotion, 0.5)
+        # Prioritize user's selected genres
+        final_genres = user_genres if user_genres else emotion_genres
         
-        return {
-            'genres': final_genres,
-            'target_valence': valence_target,  # Happiness of the track
-            'target_energy': energy_target,     # Intensity of the track
-            'dominant_emotion': dominant_emotion,
-            'sentiment_score': sentiment,
-            'user_method': user_prefs['method'],
-            'user_preferences': user_prefs
-        }
+    elif method == 'spotify_profile':
+        # Will use Spotify's recommendation engine with user's profile
+        final_genres = None  # Handled by Spotify API
+        
+    else:  # seed_input
+        # Use emotion genres as backup
+        final_genres = emotion_genres
+    
+    # Map sentiment to audio features
+    # Sentiment ranges from -1 (negative) to 1 (positive)
+    valence_target = (sentiment + 1) / 2  # Convert to 0-1 range
+    
+    # Adjust energy based on emotion
+    energy_target = _ENERGY_MAP.get(dominant_emotion, 0.5)
+    
+    # One-hot genre weights over _SORTED_GENRES for vectorized similarity
+    # (mood genres outside the picker list, e.g. disco, have no slot)
+    genre_index = MusicPreferenceCapture._GENRE_INDEX
+    genre_vector = np.zeros(len(genre_index), dtype=np.float32)
+    genre_vector[[genre_index[g] for g in final_genres or () if g in genre_index]] = 1.0
+    
+    return {
+        'genres': final_genres,
+        'genre_vector': genre_vector,
+        'target_valence': valence_target,  # Happiness of the track
+        'target_energy': energy_target,     # Intensity of the track
+        'dominant_emotion': dominant_emotion,
+        'sentiment_score': sentiment,
+        'user_method': method
+    }
 
+def _render_metrics(items):
+    """Lay out (label, value) metrics side by side in one row of columns"""
+    for col, (label, value) in zip(st.columns(len(items)), items):
+        with col:
+            st.metric(label, value)
 
 def render_preference_summary(preferences):
     """Display a summary of user preferences"""
     st.subheader("Preference Summary")
     
     if preferences['method'] == 'genre_selection':
-        if preferences['genres']:
-            st.write("**Selected Genres:**")
-            st.write(", ".join([g.title() for g in preferences['genres']]))
-        else:
+        if not preferences['genres']:
             st.warning("No genres selected yet")
-            
-        col1, col2 = st.columns(2)
-        with col1:
-            st.metric("Explicit Content", "Allowed" if preferences['explicit_allowed'] else "Filtered")
-        with col2:
-            pop_range = preferences['popularity_range']
-            st.metric("Popularity Range", f"{pop_range[0]}-{pop_range[1]}")
-            
+            return
+        
+        st.write("**Selected Genres:**")
+        st.write(", ".join([g.title() for g in preferences['genres']]))
+        
+        pop_range = preferences['popularity_range']
+        _render_metrics([
+            ("Explicit Content", "Allowed" if preferences['explicit_allowed'] else "Filtered"),
+            ("Popularity Range", f"{pop_range[0]}-{pop_range[1]}")
+        ])
+        
     elif preferences['method'] == 'spotify_profile':
         if preferences['authenticated']:
             st.success("Will use your Spotify listening history")
@@ -0,0 +1,71 @@
+"""
+Speculative recommendation prefetch
+Starts generating recommendations in the background once a chat is analyzed,
+so they are usually ready by the time the user opens the Recommendations page
+"""
+import copy
+import os
+from concurrent.futures import ThreadPoolExecutor
+import streamlit as st
+from models.music_recommender import MusicRecommender
+from services.spotify_client import get_client
+
+# Track count the Recommendations page slider starts at
+DEFAULT_TRACK_COUNT = 20
+
+# How long the Recommendations page waits on an unfinished prefetch
+PREFETCH_TIMEOUT = 30
+
+def prefetch_enabled():
+    """Prefetching spends API quota even if the user never asks, so it is opt-in"""
+    return os.getenv('PREFETCH_RECOMMENDATIONS', 'False').lower() in ('1', 'true', 'yes')
+
+@st.cache_resource
+def get_prefetch_executor():
+    """Shared worker pool for background recommendation generation"""
+    return ThreadPoolExecutor(max_workers=2)
+
+def start_prefetch(session_id, analysis_results, user_prefs, limit=DEFAULT_TRACK_COUNT):
+    """
+    Start generating recommendations in the background
+    
+    Args:
+        session_id: Database ID of the analyzed chat session
+        analysis_results: Results from ChatAnalyzer
+        user_prefs: Preferences already captured on the Recommendations page
+        limit: Number of tracks to recommend
+    """
+    user_prefs = copy.deepcopy(user_prefs)
+    
+    def generate():
+        spotify = get_client(use_oauth=True)
+        recommender = MusicRecommender(spotify)
+        return recommender.generate_recommendations(analysis_results, user_prefs, limit)
+    
+    st.session_state.recs_prefetch = {
+        'session_id': session_id,
+        'prefs': user_prefs,
+        'limit': limit,
+        'future': get_prefetch_executor().submit(generate)
+    }
+
+def take_prefetched(session_id, user_prefs, limit):
+    """
+    Claim prefetched recommendations if they were made for the same request
+    
+    Returns:
+        list: Recommendations, or None if there is no usable prefetch
+    """
+    prefetch = st.session_state.pop('recs_prefetch', None)
+    if not prefetch:
+        return None
+    
+    if (prefetch['session_id'], prefetch['prefs'], prefetch['limit']) != (session_id, user_prefs, limit):
+        prefetch['future'].cancel()
+        return None
+    
+    try:
+        return prefetch['future'].result(timeout=PREFETCH_TIMEOUT)
+    except Exception as e:
+        print(f"Prefetched recommendations unavailable: {e}")
+        return None
@@ -0,0 +1,41 @@
+"""
+Rate Limiter
+Process-wide token bucket that paces outbound API requests
+"""
+import threading
+import time
+
+class TokenBucket:
+    """Thread-safe token bucket: bursts up to `capacity`, then `refill_per_sec`"""
+    
+    def __init__(self, capacity, refill_per_sec):
+        """
+        Args:
+            capacity: Maximum tokens held (largest burst allowed)
+            refill_per_sec: Tokens added back per second
+        """
+        self.capacity = capacity
+        self.refill_per_sec = refill_per_sec
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def acquire(self, tokens=1):
+        """Take `tokens` from the bucket, blocking until they are available"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.capacity,
+                    self._tokens + (now - self._updated) * self.refill_per_sec
+                )
+                self._updated = now
+                
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                
+                wait = (tokens - self._tokens) / self.refill_per_sec
+            
+            # Sleep outside the lock so other threads are not held up meanwhile
+            time.sleep(wait)
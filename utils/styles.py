@@ -0,0 +1,22 @@
+"""
+Shared page styling
+Reads the custom stylesheet once per process and injects it on every page
+"""
+import os
+import streamlit as st
+
+CSS_FILE = "styles/custom.css"
+
+@st.cache_resource
+def get_css_blob(css_file=CSS_FILE):
+    """Stylesheet wrapped in a <style> tag, read from disk on first use only"""
+    if not os.path.exists(css_file):
+        return ''
+    with open(css_file) as f:
+        return f'<style>{f.read()}</style>'
+
+def load_css():
+    """Inject the custom stylesheet into the current page"""
+    css = get_css_blob()
+    if css:
+        st.markdown(css, unsafe_allow_html=True)